@@ -1,12 +1,20 @@
 import streamlit as st
 import pandas as pd
 import time
-from datetime import datetime, timedelta
-import os
-import json
-import re
-from PIL import Image
+from datetime import date, datetime, timedelta
 import altair as alt
+import streamlit.components.v1 as components
+from armazenamento import salvar_registro, consultar_registros
+from registro import Registro, para_exibicao
+import armazenamento
+from resumos import resumo_diario, indice_ritm, horas_por_atividade, horas_por_periodo
+from chave_valor import usuarios_db, status_ritm_db, timers_db
+from ritm import status_precisa_normalizar, normalizar_status
+import metricas
+import transferencia
+import credenciais
+from imagens import miniatura
+from metricas import medir
 
 
 st.set_page_config(page_title="Radix Time Tracker", layout="wide", page_icon="⏱")
@@ -48,57 +56,112 @@ def configurar_estilo():
     </style>
     """, unsafe_allow_html=True)
 
-FILE_DB = "registro_atividades.csv"
-FILE_USERS = "usuarios.json"
-FILE_RITM_STATUS = "ritms_status.json"
-
 def init_db():
-    if not os.path.exists(FILE_DB):
-        df = pd.DataFrame(columns=["usuario", "atividade", "hora_inicio", "hora_fim", "duracao_formatada", "segundos_totais", "data", "tipo"])
-        df.to_csv(FILE_DB, index=False)
-    
-    if not os.path.exists(FILE_USERS):
-        users = {
-            "admin": {"nome": "Administrador", "senha": "123", "cargo": "chefe", "foto": "fotos/user_admin.jpg"},
-            "dev": {"nome": "Desenvolvedor", "senha": "123", "cargo": "funcionario", "foto": "fotos/user_dev.jpg"}
-        }
-        with open(FILE_USERS, "w", encoding="utf-8") as f:
-            json.dump(users, f)
-            
-    if not os.path.exists(FILE_RITM_STATUS):
-        with open(FILE_RITM_STATUS, "w", encoding="utf-8") as f:
-            json.dump({}, f)
+    armazenamento.init_db()
+    usuarios_db.inicializar({
+        "admin": {"nome": "Administrador", "senha": "123", "cargo": "chefe", "foto": "fotos/user_admin.jpg"},
+        "dev": {"nome": "Desenvolvedor", "senha": "123", "cargo": "funcionario", "foto": "fotos/user_dev.jpg"}
+    })
+    status_ritm_db.inicializar({})
+    timers_db.inicializar({})
+    if credenciais.precisa_migrar(usuarios_db.carregar()):
+        usuarios_db.atualizar(credenciais.migrar_senhas)
+    if status_precisa_normalizar(status_ritm_db.carregar()):
+        status_ritm_db.atualizar(normalizar_status)
 
 def carregar_usuarios():
-    with open(FILE_USERS, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return usuarios_db.carregar()
 
 def carregar_status_ritm():
-    with open(FILE_RITM_STATUS, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return status_ritm_db.carregar()
 
 def atualizar_status_ritm(ritm_code, status):
-    dados = carregar_status_ritm()
-    dados[ritm_code] = status 
-    with open(FILE_RITM_STATUS, "w", encoding="utf-8") as f:
-        json.dump(dados, f)
-
-def salvar_registro(dados):
-    df = pd.read_csv(FILE_DB)
-    df_novo = pd.DataFrame([dados])
-    df = pd.concat([df, df_novo], ignore_index=True)
-    df.to_csv(FILE_DB, index=False)
+    status_ritm_db.definir(ritm_code, status)
+
+def salvar_timer_ativo(user_id):
+    timers_db.definir(user_id, {
+        "atividade": st.session_state.atividade_atual,
+        "status": st.session_state.timer_status,
+        "inicio_tempo": st.session_state.inicio_tempo,
+        "tempo_acumulado": st.session_state.tempo_acumulado
+    })
+
+def limpar_timer_ativo(user_id):
+    timers_db.remover(user_id)
+
+def restaurar_timer(user_id):
+    timer = timers_db.obter(user_id)
+    st.session_state.timer_status = timer["status"] if timer else "parado"
+    st.session_state.inicio_tempo = timer["inicio_tempo"] if timer else None
+    st.session_state.tempo_acumulado = timer["tempo_acumulado"] if timer else 0
+    st.session_state.atividade_atual = timer["atividade"] if timer else ""
+
+ITENS_POR_PAGINA = 20
+
+def filtrar_ritms(resumo, status_db, chave):
+    # Busca, filtro de status, ordenação e paginação sobre o resumo (pequeno); só a página visível é renderizada
+    resumo = resumo.assign(status=resumo["ritm_code"].map(status_db).fillna("Aberto"))
+    f1, f2, f3 = st.columns([2, 1, 1])
+    busca = f1.text_input("Buscar RITM", placeholder="RITM0000", key=f"{chave}_busca")
+    filtro_status = f2.selectbox("Status", ["Todos", "Aberto", "Fechado"], key=f"{chave}_status")
+    ordem = f3.selectbox("Ordenar por", ["Mais tempo", "Menos tempo", "Código"], key=f"{chave}_ordem")
+
+    if busca:
+        resumo = resumo[resumo["ritm_code"].str.contains(busca.strip().upper().replace("-", ""), regex=False)]
+    if filtro_status != "Todos":
+        resumo = resumo[resumo["status"] == filtro_status]
+    if ordem == "Código":
+        resumo = resumo.sort_values("ritm_code")
+    else:
+        resumo = resumo.sort_values("segundos_totais", ascending=(ordem == "Menos tempo"))
+
+    total_paginas = max(1, -(-len(resumo) // ITENS_POR_PAGINA))
+    chave_pagina = f"{chave}_pagina"
+    if st.session_state.get(chave_pagina, 1) > total_paginas:
+        st.session_state[chave_pagina] = 1
+    pagina = 1
+    if total_paginas > 1:
+        pagina = st.number_input("Página", min_value=1, max_value=total_paginas, step=1, key=chave_pagina)
+    st.caption(f"{len(resumo)} chamado(s) — página {pagina} de {total_paginas}")
+    inicio = (pagina - 1) * ITENS_POR_PAGINA
+    return resumo.iloc[inicio:inicio + ITENS_POR_PAGINA]
+
+def cronometro_cliente(segundos_base):
+    # O relógio corre no navegador: o servidor só envia o valor inicial, sem reruns a cada segundo
+    html = f"""
+    <div id="timer" style="font-size: 5rem; font-weight: 700; text-align: center; color: {PRIMARY_COLOR};
+        font-family: 'Courier New', monospace; background-color: #FFF; border-radius: 15px; padding: 20px;
+        border: 2px solid {BG_LIGHT};">{formatar_tempo(segundos_base)}</div>
+    <script>
+    const base = {float(segundos_base)};
+    const t0 = Date.now();
+    const el = document.getElementById("timer");
+    function tick() {{
+        const s = Math.floor(base + (Date.now() - t0) / 1000);
+        const h = Math.floor(s / 3600), m = Math.floor(s % 3600 / 60), sec = s % 60;
+        el.textContent = h + ":" + String(m).padStart(2, "0") + ":" + String(sec).padStart(2, "0");
+    }}
+    tick();
+    setInterval(tick, 500);
+    </script>
+    """
+    if hasattr(st, "iframe"):
+        st.iframe(html, height=170)
+    else:
+        components.html(html, height=170)
 
 def formatar_tempo(segundos):
     return str(timedelta(seconds=int(segundos)))
 
-def extrair_ritm(texto):
-    if not isinstance(texto, str): return None
-    match = re.search(r'(RITM[-]?\d+)', texto.upper())
-    if match:
-        return match.group(1)
-    return None
+def avisar_e_recarregar(mensagem, icone):
+    # O toast é mostrado no rerun seguinte, sem segurar a sessão com time.sleep
+    st.session_state.aviso_pendente = (mensagem, icone)
+    st.rerun()
 
+def mostrar_aviso_pendente():
+    aviso = st.session_state.pop("aviso_pendente", None)
+    if aviso:
+        st.toast(aviso[0], icon=aviso[1])
 
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
@@ -110,6 +173,8 @@ if "tempo_acumulado" not in st.session_state:
     st.session_state.tempo_acumulado = 0
 if "atividade_atual" not in st.session_state:
     st.session_state.atividade_atual = ""
+if "imp_rodada" not in st.session_state:
+    st.session_state.imp_rodada = 0
 
 init_db()
 configurar_estilo()
@@ -118,11 +183,9 @@ configurar_estilo()
 def login_screen():
     col1, col2, col3 = st.columns([1, 1.5, 1])
     with col2:
-        if os.path.exists(CAMINHO_LOGO):
-            try:
-                st.image(Image.open(CAMINHO_LOGO), use_container_width=True)
-            except:
-                st.markdown(f"<h1 style='text-align: center; color: {PRIMARY_COLOR};'>Radix Ponto</h1>", unsafe_allow_html=True)
+        logo = miniatura(CAMINHO_LOGO, 600)
+        if logo:
+            st.image(logo, use_container_width=True)
         else:
             st.markdown(f"<h1 style='text-align: center; color: {PRIMARY_COLOR};'>Radix Ponto</h1>", unsafe_allow_html=True)
         
@@ -134,26 +197,26 @@ def login_screen():
             
             if st.button("Acessar Sistema", type="primary"):
                 usuarios = carregar_usuarios()
-                if user in usuarios and usuarios[user]["senha"] == senha:
+                if user in usuarios and credenciais.verificar_senha(senha, usuarios[user]):
                     st.session_state.logged_in = True
-                    st.session_state.usuario_info = usuarios[user]
+                    st.session_state.usuario_info = credenciais.dados_publicos(usuarios[user])
                     st.session_state.usuario_info["user_id"] = user
-                    st.toast(f"Bem-vindo, {usuarios[user]['nome']}!", icon="👋")
-                    time.sleep(1)
-                    st.rerun()
+                    restaurar_timer(user)
+                    avisar_e_recarregar(f"Bem-vindo, {usuarios[user]['nome']}!", "👋")
                 else:
                     st.error("Credenciais inválidas.")
 
 def sidebar_info():
     with st.sidebar:
-        if os.path.exists(CAMINHO_LOGO):
-            st.image(CAMINHO_LOGO, width=180)
+        logo = miniatura(CAMINHO_LOGO, 360)
+        if logo:
+            st.image(logo, width=180)
             st.write('')
         
         info = st.session_state.usuario_info
-        foto_path = info.get("foto", "")
-        if foto_path and os.path.exists(foto_path):
-            st.image(Image.open(foto_path), width=150)
+        foto = miniatura(info.get("foto", ""), 300)
+        if foto:
+            st.image(foto, width=150)
         else:
             st.markdown(f"<div style='font-size: 80px; color: {PRIMARY_COLOR};'>👤</div>", unsafe_allow_html=True)
 
@@ -169,13 +232,8 @@ def funcionario_dashboard():
     user_id = st.session_state.usuario_info["user_id"]
     hoje_str = datetime.now().strftime("%Y-%m-%d")
 
-    df = pd.read_csv(FILE_DB)
-    
-  
-    total_hoje_seg = 0
-    if not df.empty:
-        df_hoje = df[(df["usuario"] == user_id) & (df["data"] == hoje_str)]
-        total_hoje_seg = df_hoje["segundos_totais"].sum()
+    with medir("resumo.total_hoje"):
+        total_hoje_seg = resumo_diario.total_dia(hoje_str, user_id)[0]
     
     tempo_sessao_atual = 0
     if st.session_state.timer_status == "rodando":
@@ -223,51 +281,36 @@ def funcionario_dashboard():
                         st.session_state.atividade_atual = nome_final
                         st.session_state.inicio_tempo = time.time()
                         st.session_state.timer_status = "rodando"
+                        salvar_timer_ativo(user_id)
                         st.rerun()
             
             elif st.session_state.timer_status == "rodando":
                 if b2.button("⏸ PAUSAR"):
                     st.session_state.tempo_acumulado += time.time() - st.session_state.inicio_tempo
                     st.session_state.timer_status = "pausado"
+                    salvar_timer_ativo(user_id)
                     st.rerun()
                 if b3.button("✅ FINALIZAR", type="primary"):
                     total = st.session_state.tempo_acumulado + (time.time() - st.session_state.inicio_tempo)
-                    dados = {
-                        "usuario": user_id,
-                        "atividade": st.session_state.atividade_atual,
-                        "hora_inicio": datetime.fromtimestamp(st.session_state.inicio_tempo).strftime("%H:%M:%S"),
-                        "hora_fim": datetime.now().strftime("%H:%M:%S"),
-                        "duracao_formatada": formatar_tempo(total),
-                        "segundos_totais": int(total),
-                        "data": hoje_str,
-                        "tipo": "timer"
-                    }
-                    salvar_registro(dados)
+                    salvar_registro(Registro.intervalo(user_id, st.session_state.atividade_atual,
+                                                       st.session_state.inicio_tempo, time.time(), "timer", total))
+                    limpar_timer_ativo(user_id)
                     st.session_state.timer_status = "parado"
                     st.session_state.tempo_acumulado = 0
                     st.session_state.atividade_atual = ""
-                    st.toast("Salvo!", icon="💾")
-                    time.sleep(1)
-                    st.rerun()
+                    avisar_e_recarregar("Salvo!", "💾")
 
             elif st.session_state.timer_status == "pausado":
                 if b1.button("▶ RETOMAR"):
                     st.session_state.inicio_tempo = time.time()
                     st.session_state.timer_status = "rodando"
+                    salvar_timer_ativo(user_id)
                     st.rerun()
                 if b3.button("✅ FINALIZAR", type="primary"):
                     total = st.session_state.tempo_acumulado
-                    dados = {
-                        "usuario": user_id,
-                        "atividade": st.session_state.atividade_atual,
-                        "hora_inicio": "N/A",
-                        "hora_fim": datetime.now().strftime("%H:%M:%S"),
-                        "duracao_formatada": formatar_tempo(total),
-                        "segundos_totais": int(total),
-                        "data": hoje_str,
-                        "tipo": "timer"
-                    }
-                    salvar_registro(dados)
+                    salvar_registro(Registro.intervalo(user_id, st.session_state.atividade_atual,
+                                                       None, time.time(), "timer", total))
+                    limpar_timer_ativo(user_id)
                     st.session_state.timer_status = "parado"
                     st.session_state.tempo_acumulado = 0
                     st.session_state.atividade_atual = ""
@@ -276,12 +319,8 @@ def funcionario_dashboard():
         with col_timer:
             container_timer = st.empty()
             if st.session_state.timer_status == "rodando":
-                while st.session_state.timer_status == "rodando":
-                    agora = time.time()
-                    delta = st.session_state.tempo_acumulado + (agora - st.session_state.inicio_tempo)
-                    fmt = str(timedelta(seconds=int(delta)))
-                    container_timer.markdown(f"<div class='big-timer'>{fmt}</div>", unsafe_allow_html=True)
-                    time.sleep(0.5)
+                with container_timer:
+                    cronometro_cliente(st.session_state.tempo_acumulado + (time.time() - st.session_state.inicio_tempo))
             elif st.session_state.timer_status == "pausado":
                  fmt = str(timedelta(seconds=int(st.session_state.tempo_acumulado)))
                  container_timer.markdown(f"<div class='big-timer' style='color:#FF9800'>{fmt}</div>", unsafe_allow_html=True)
@@ -299,21 +338,8 @@ def funcionario_dashboard():
                 dt_ini = datetime.combine(datetime.today(), h_ini)
                 dt_fim = datetime.combine(datetime.today(), h_fim)
                 if dt_fim > dt_ini:
-                    secs = (dt_fim - dt_ini).total_seconds()
-                    dados = {
-                        "usuario": user_id,
-                        "atividade": ativ_manual,
-                        "hora_inicio": str(h_ini),
-                        "hora_fim": str(h_fim),
-                        "duracao_formatada": formatar_tempo(secs),
-                        "segundos_totais": int(secs),
-                        "data": hoje_str,
-                        "tipo": "manual"
-                    }
-                    salvar_registro(dados)
-                    st.toast("Salvo!", icon="✅")
-                    time.sleep(1)
-                    st.rerun()
+                    salvar_registro(Registro.intervalo(user_id, ativ_manual, dt_ini, dt_fim, "manual"))
+                    avisar_e_recarregar("Salvo!", "✅")
                 else:
                     st.error("Hora fim < Hora início")
 
@@ -322,52 +348,40 @@ def funcionario_dashboard():
         st.subheader("Meus Chamados e Entregas")
         st.info("Aqui você gerencia o encerramento dos chamados em que trabalhou.")
    
-        if not df.empty:
-            df_user_ritm = df[df["usuario"] == user_id].copy()
-            df_user_ritm["ritm_code"] = df_user_ritm["atividade"].apply(extrair_ritm)
-            df_user_ritm = df_user_ritm.dropna(subset=["ritm_code"])
-            
-            if df_user_ritm.empty:
-                st.write("Você ainda não registrou atividades vinculadas a um RITM.")
-            else:
-                
-                status_db = carregar_status_ritm()
-                
-                meus_ritms = df_user_ritm['ritm_code'].unique()
-                
-                for ritm in meus_ritms:
-                
-                    df_ritm_global = df[df["atividade"].str.contains(ritm, na=False)]
-                    total_horas_ritm = df_ritm_global["segundos_totais"].sum()
-                    
-                    status_atual = status_db.get(ritm, "Aberto")
-                 
+        with medir("ritm.indice"):
+            resumo_meus = indice_ritm.resumo_usuario(user_id)
+        if resumo_meus.empty:
+            st.write("Você ainda não registrou atividades vinculadas a um RITM.")
+        else:
+            status_db = carregar_status_ritm()
+            pagina_ritms = filtrar_ritms(resumo_meus, status_db, "meus_ritms")
+
+            with medir("render.cards_ritm"):
+                for ritm, total_horas_ritm, status_atual in pagina_ritms[["ritm_code", "segundos_totais", "status"]].itertuples(index=False):
                     cor_status = SUCCESS_COLOR if status_atual == "Aberto" else "#BDBDBD"
                     icon_status = "🟢 Em Andamento" if status_atual == "Aberto" else "🔒 Encerrado"
-                    
+                
                     with st.container(border=True):
                         col_info, col_action = st.columns([3, 1])
-                        
+                    
                         with col_info:
                             st.markdown(f"### {ritm}")
                             st.markdown(f"**Status:** <span style='color:{cor_status}; font-weight:bold'>{icon_status}</span>", unsafe_allow_html=True)
                             st.write(f"Tempo Total Investido (Equipe): **{formatar_tempo(total_horas_ritm)}**")
-                        
+                    
                         with col_action:
                             if status_atual == "Aberto":
                                 if st.button(f"Encerrar Chamado", key=f"close_{ritm}", type="primary"):
                                     atualizar_status_ritm(ritm, "Fechado")
-                                    st.success("Chamado Encerrado!")
-                                    time.sleep(1)
-                                    st.rerun()
+                                    avisar_e_recarregar("Chamado Encerrado!", "✅")
                             else:
                                 st.button("Reabrir Chamado", key=f"reopen_{ritm}", on_click=atualizar_status_ritm, args=(ritm, "Aberto"))
-                                
+                            
                             # Botão de Email (Sempre visível se quiser reenviar)
                             assunto = f"Encerramento do Chamado {ritm}"
                             corpo = f"Prezados,%0A%0AInformamos que o chamado {ritm} foi concluído.%0A%0ATempo total investido: {formatar_tempo(total_horas_ritm)}%0A%0AAtenciosamente,%0A{st.session_state.usuario_info['nome']}."
                             link_email = f"mailto:?subject={assunto}&body={corpo}"
-                            
+                        
                             st.markdown(f"""
                             <a href="{link_email}" target="_blank" style="text-decoration:none;">
                                 <div style="background-color: #f0f2f6; color: #31333F; padding: 8px; border-radius: 5px; text-align: center; border: 1px solid #d6d6d8; font-weight: 500; margin-top: 5px;">
@@ -376,117 +390,195 @@ def funcionario_dashboard():
                             </a>
                             """, unsafe_allow_html=True)
 
-    
+
     st.divider()
     st.markdown("### 📊 Minhas Estatísticas")
-    periodo = st.radio("Período", ["Hoje", "7 Dias", "30 Dias"], horizontal=True)
+    periodo = st.radio("Período", ["Hoje", "7 Dias", "30 Dias", "90 Dias", "Ano"], horizontal=True)
     
-    df_user = df[df["usuario"] == user_id].copy()
-    if not df_user.empty:
-        df_user['data_dt'] = pd.to_datetime(df_user['data'])
-        hoje_dt = pd.to_datetime(hoje_str)
-        if periodo == "Hoje":
-            df_chart = df_user[df_user['data_dt'] == hoje_dt]
-        elif periodo == "7 Dias":
-            data_limite = hoje_dt - timedelta(days=7)
-            df_chart = df_user[df_user['data_dt'] >= data_limite]
-        else:
-            data_limite = hoje_dt - timedelta(days=30)
-            df_chart = df_user[df_user['data_dt'] >= data_limite]
-        
-        if not df_chart.empty:
-            df_chart['Horas'] = df_chart['segundos_totais'] / 3600
-            g1, g2 = st.columns([1.5, 1])
-            with g1:
-                chart_bar = alt.Chart(df_chart).mark_bar().encode(
-                    x=alt.X('sum(Horas)', title='Total de Horas', axis=alt.Axis(format='.1f')),
-                    y=alt.Y('atividade', sort='-x', title=''),
+    hoje_dt = pd.to_datetime(hoje_str)
+    dias_periodo = {"Hoje": 0, "7 Dias": 7, "30 Dias": 30, "90 Dias": 90, "Ano": 365}[periodo]
+    with medir("resumo.periodo"):
+        df_chart = resumo_diario.por_atividade(user_id, hoje_dt - timedelta(days=dias_periodo), hoje_dt)
+    if not df_chart.empty:
+        g1, g2 = st.columns([1.5, 1])
+        with g1:
+            with medir("grafico.construir"):
+                df_atividades = horas_por_atividade(df_chart)
+                chart_bar = alt.Chart(df_atividades).mark_bar().encode(
+                    x=alt.X('Horas:Q', title='Total de Horas', axis=alt.Axis(format='.1f')),
+                    y=alt.Y('atividade:N', sort='-x', title=''),
                     color=alt.value(PRIMARY_COLOR),
-                    tooltip=['atividade', alt.Tooltip('sum(Horas)', format='.2f')]
+                    tooltip=['atividade', alt.Tooltip('Horas:Q', format='.2f')]
                 )
+            with medir("render.grafico"):
                 st.altair_chart(chart_bar, use_container_width=True)
-            with g2:
-                if periodo == "Hoje":
-                    st.dataframe(df_chart[['atividade', 'hora_inicio', 'duracao_formatada']], hide_index=True, use_container_width=True)
-                else:
-                    chart_line = alt.Chart(df_chart).mark_bar(width=20).encode(
-                        x=alt.X('data', title='Data'),
-                        y=alt.Y('sum(Horas)', title='Horas'),
-                        color=alt.value(SECONDARY_COLOR)
+        with g2:
+            if periodo == "Hoje":
+                df_hoje = para_exibicao(consultar_registros(user_id, hoje_dt, hoje_dt, ['atividade', 'inicio', 'segundos_totais']))
+                st.dataframe(df_hoje[['atividade', 'hora_inicio', 'duracao_formatada']], hide_index=True, use_container_width=True)
+            else:
+                with medir("grafico.construir"):
+                    df_dias, semanal = horas_por_periodo(df_chart)
+                    chart_line = alt.Chart(df_dias).mark_bar(width=8 if semanal else 20).encode(
+                        x=alt.X('data:T', title='Semana' if semanal else 'Data'),
+                        y=alt.Y('Horas:Q', title='Horas'),
+                        color=alt.value(SECONDARY_COLOR),
+                        tooltip=[alt.Tooltip('data:T', title='Semana de' if semanal else 'Data'), alt.Tooltip('Horas:Q', format='.2f')]
                     )
+                with medir("render.grafico"):
                     st.altair_chart(chart_line, use_container_width=True)
 
 def chefe_dashboard():
     sidebar_info()
     st.title("📊 Painel de Gestão")
     
-    tab_geral, tab_ritm_admin = st.tabs(["📈 Visão Geral", "📋 Relatório de Chamados"])
+    tab_geral, tab_agora, tab_ritm_admin, tab_transferencia = st.tabs(["📈 Visão Geral", "🟢 Trabalhando Agora", "📋 Relatório de Chamados", "📤 Importar / Exportar"])
     
-    df = pd.read_csv(FILE_DB)
-    if df.empty:
-        st.warning("Sem dados.")
-        return
+    with tab_agora:
+        # Vem dos timers ativos, não do histórico: aparece mesmo sem nenhum registro finalizado
+        timers = timers_db.carregar()
+        if not timers:
+            st.info("Ninguém está com cronômetro ativo no momento.")
+        else:
+            usuarios_cad = carregar_usuarios()
+            agora = time.time()
+            linhas = []
+            for uid, timer in timers.items():
+                decorrido = timer["tempo_acumulado"]
+                if timer["status"] == "rodando":
+                    decorrido += agora - timer["inicio_tempo"]
+                linhas.append({
+                    "Funcionário": usuarios_cad.get(uid, {}).get("nome", uid),
+                    "Atividade": timer["atividade"],
+                    "Status": "▶ Rodando" if timer["status"] == "rodando" else "⏸ Pausado",
+                    "Tempo": formatar_tempo(decorrido)
+                })
+            st.dataframe(pd.DataFrame(linhas), use_container_width=True, hide_index=True)
+
+    with medir("resumo.datas"):
+        datas = resumo_diario.datas()
 
  
     with tab_geral:
-        c1, c2 = st.columns(2)
-        with c1:
-            datas = sorted(df["data"].unique(), reverse=True)
-            sel_data = st.selectbox("Data", datas)
-        with c2:
-            usuarios = ["Todos"] + list(df["usuario"].unique())
-            sel_user = st.selectbox("Funcionário", usuarios)
-
-        df_filtered = df[df["data"] == sel_data]
-        if sel_user != "Todos":
-            df_filtered = df_filtered[df_filtered["usuario"] == sel_user]
-
-        st.markdown("---")
-        k1, k2, k3 = st.columns(3)
-        total_secs = df_filtered["segundos_totais"].sum()
-        k1.metric("Total Horas", formatar_tempo(total_secs).split(".")[0])
-        k2.metric("Tarefas", len(df_filtered))
-        k3.metric("Média", formatar_tempo(total_secs / len(df_filtered) if len(df_filtered) > 0 else 0).split(".")[0])
-        st.dataframe(df_filtered, use_container_width=True, hide_index=True)
+        if not datas:
+            st.warning("Sem dados.")
+        else:
+            c1, c2 = st.columns(2)
+            with c1:
+                sel_data = st.selectbox("Data", datas, format_func=lambda d: d.strftime("%Y-%m-%d"))
+            with c2:
+                usuarios = ["Todos"] + resumo_diario.usuarios()
+                sel_user = st.selectbox("Funcionário", usuarios)
+
+            with medir("consulta.dia"):
+                df_filtered = consultar_registros(None if sel_user == "Todos" else sel_user, sel_data, sel_data)
+
+            st.markdown("---")
+            k1, k2, k3 = st.columns(3)
+            total_secs, qtd_tarefas = resumo_diario.total_dia(sel_data, None if sel_user == "Todos" else sel_user)
+            k1.metric("Total Horas", formatar_tempo(total_secs).split(".")[0])
+            k2.metric("Tarefas", qtd_tarefas)
+            k3.metric("Média", formatar_tempo(total_secs / qtd_tarefas if qtd_tarefas > 0 else 0).split(".")[0])
+            with medir("render.tabela"):
+                st.dataframe(para_exibicao(df_filtered), use_container_width=True, hide_index=True)
 
   
     with tab_ritm_admin:
         st.subheader("Status dos Chamados (Read-Only)")
         
-        df["ritm_code"] = df["atividade"].apply(extrair_ritm)
-        df_ritms = df.dropna(subset=["ritm_code"])
+        with medir("ritm.indice"):
+            resumo_ritm = indice_ritm.resumo()
         
-        if df_ritms.empty:
+        if resumo_ritm.empty:
             st.info("Nenhum RITM encontrado.")
         else:
             status_db = carregar_status_ritm()
-           
-            resumo_ritm = df_ritms.groupby(['ritm_code'])['segundos_totais'].sum().reset_index()
-            
+            pagina_ritms = filtrar_ritms(resumo_ritm, status_db, "admin_ritms")
             
-            for idx, row in resumo_ritm.iterrows():
-                ritm = row['ritm_code']
-                total = row['segundos_totais']
-                status = status_db.get(ritm, "Aberto")
+            with medir("render.cards_ritm"):
+                for ritm, total, status in pagina_ritms[["ritm_code", "segundos_totais", "status"]].itertuples(index=False):
+                    contribuidores = ", ".join(indice_ritm.contribuidores(ritm))
               
-                cor_card = "#E8F5E9" if status == "Aberto" else "#EEEEEE" # Verde claro ou Cinza
-                cor_texto = "#2E7D32" if status == "Aberto" else "#616161"
-                icon = "🟢 EM ABERTO" if status == "Aberto" else "🔒 FECHADO"
+                    cor_card = "#E8F5E9" if status == "Aberto" else "#EEEEEE" # Verde claro ou Cinza
+                    cor_texto = "#2E7D32" if status == "Aberto" else "#616161"
+                    icon = "🟢 EM ABERTO" if status == "Aberto" else "🔒 FECHADO"
                 
-                with st.container():
-                    st.markdown(f"""
-                    <div style="background-color: {cor_card}; padding: 15px; border-radius: 8px; margin-bottom: 10px; border-left: 5px solid {cor_texto}">
-                        <h4 style="margin:0; color: #333">{ritm}</h4>
-                        <p style="margin:0; font-weight:bold; color: {cor_texto}">{icon}</p>
-                        <p style="margin:0">Tempo Total Gasto: {formatar_tempo(total)}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-
+                    with st.container():
+                        st.markdown(f"""
+                        <div style="background-color: {cor_card}; padding: 15px; border-radius: 8px; margin-bottom: 10px; border-left: 5px solid {cor_texto}">
+                            <h4 style="margin:0; color: #333">{ritm}</h4>
+                            <p style="margin:0; font-weight:bold; color: {cor_texto}">{icon}</p>
+                            <p style="margin:0">Tempo Total Gasto: {formatar_tempo(total)}</p>
+                            <p style="margin:0; color: #555">Colaboradores: {contribuidores}</p>
+                        </div>
+                        """, unsafe_allow_html=True)
+
+    with tab_transferencia:
+        aba_transferencia(datas)
+
+    painel_desempenho()
+
+def aba_transferencia(datas):
+    st.subheader("Exportar registros")
+    e1, e2, e3 = st.columns([2, 1, 1])
+    periodo = e1.date_input("Período", value=(min(datas), max(datas)) if datas else (date.today(), date.today()), key="exp_periodo")
+    exp_user = e2.selectbox("Funcionário", ["Todos"] + resumo_diario.usuarios(), key="exp_user")
+    formato = e3.radio("Formato", ["CSV", "XLSX"], horizontal=True, key="exp_formato")
+    if len(periodo) == 2:
+        filtro = (None if exp_user == "Todos" else exp_user, periodo[0], periodo[1])
+        nome = f"registros_{periodo[0]}_{periodo[1]}"
+        if formato == "CSV":
+            st.download_button("⬇ Baixar CSV", lambda: transferencia.exportar_csv(*filtro), file_name=f"{nome}.csv", mime="text/csv")
+        elif transferencia.openpyxl is None:
+            st.warning("Exportar para Excel requer o pacote openpyxl.")
+        else:
+            st.download_button("⬇ Baixar XLSX", lambda: transferencia.exportar_xlsx(*filtro), file_name=f"{nome}.xlsx",
+                               mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
+    st.divider()
+    st.subheader("Importar registros em lote")
+    st.caption(f"Colunas esperadas: {', '.join(transferencia.COLUNAS_IMPORTACAO)} (data AAAA-MM-DD, horas HH:MM ou HH:MM:SS); "
+               "segundos_totais opcional: quando preenchido, dá a duração e hora_inicio pode ficar vazia")
+    # A key muda a cada importação: o uploader volta vazio e o mesmo arquivo não é importado duas vezes
+    arquivo = st.file_uploader("Planilha (CSV ou XLSX)", type=["csv", "xlsx"], key=f"imp_arquivo_{st.session_state.imp_rodada}")
+    if arquivo is not None:
+        try:
+            df_imp = transferencia.ler_planilha(arquivo, arquivo.name)
+        except Exception as e:
+            st.error(f"Não foi possível ler o arquivo: {e}")
+            return
+        registros, erros = transferencia.validar_importacao(df_imp, carregar_usuarios())
+        i1, i2 = st.columns(2)
+        i1.metric("Linhas válidas", len(registros))
+        i2.metric("Linhas com erro", len(erros))
+        if erros:
+            st.dataframe(pd.DataFrame(erros, columns=["Linha", "Erro"]), use_container_width=True, hide_index=True)
+        if registros and st.button(f"Importar {len(registros)} registro(s) válido(s)", type="primary"):
+            transferencia.importar_registros(registros)
+            st.session_state.imp_rodada += 1
+            avisar_e_recarregar(f"{len(registros)} registro(s) importado(s).", "📥")
+
+def painel_desempenho():
+    # Visível só para o chefe: tempos das etapas deste rerun e acumulado do processo
+    with st.expander("🛠 Desempenho (debug)"):
+        etapas = metricas.etapas_rerun()
+        st.caption("Etapas deste rerun")
+        st.dataframe(pd.DataFrame([{"Etapa": e, "ms": round(s * 1000, 2)} for e, s in etapas]), use_container_width=True, hide_index=True)
+        st.caption("Acumulado desde o início do servidor")
+        st.dataframe(pd.DataFrame([
+            {"Etapa": e, "Chamadas": n, "Média (ms)": round(t / n * 1000, 2), "Máx (ms)": round(m * 1000, 2)}
+            for e, (n, t, m) in sorted(metricas.resumo().items())
+        ]), use_container_width=True, hide_index=True)
+        st.download_button("Baixar métricas (Prometheus)", metricas.texto_prometheus(), file_name="radix_metricas.prom")
+
+
+metricas.iniciar_rerun()
+mostrar_aviso_pendente()
 if not st.session_state.logged_in:
     login_screen()
 else:
     if st.session_state.usuario_info.get("cargo") == "chefe":
         chefe_dashboard()
     else:
-        funcionario_dashboard()
\ No newline at end of file
+        funcionario_dashboard()
+metricas.finalizar_rerun({"usuario": st.session_state.get("usuario_info", {}).get("user_id") if st.session_state.logged_in else None})
\ No newline at end of file
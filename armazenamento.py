@@ -0,0 +1,454 @@
+import csv
+import io
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+
+from metricas import medir
+from registro import Registro, converter_legado
+from ritm import extrair_ritm, extrair_ritm_series, normalizar_ritm
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+# Backend dos registros: "csv" (padrão, append-only), "parquet" (colunar, particionado por mês; requer pyarrow)
+# ou "sqlite" (um banco compartilhado por várias réplicas do app, incluindo usuários, status e timers)
+BACKEND = os.environ.get("RADIX_BACKEND", "csv")
+ARQUIVO_CSV = "registro_atividades.csv"
+PASTA_PARQUET = "registro_atividades_parquet"
+ARQUIVO_SQLITE = os.environ.get("RADIX_SQLITE", "registro_atividades.db")
+BACKENDS = {"csv": ARQUIVO_CSV, "parquet": PASTA_PARQUET, "sqlite": ARQUIVO_SQLITE}
+if BACKEND not in BACKENDS:
+    raise ValueError(f"RADIX_BACKEND inválido: {BACKEND!r} (use {', '.join(BACKENDS)})")
+FILE_DB = BACKENDS[BACKEND]
+# inicio/fim são epochs inteiros (vazio = desconhecido); horários e duração em texto são derivados na exibição
+DTYPES_LEITURA = {"usuario": "category", "atividade": "string", "inicio": "Int64", "fim": "Int64",
+                  "tipo": "category", "ritm_code": "string"}
+TAMANHO_BLOCO = 100_000
+COLUNAS = list(Registro.__slots__)
+
+
+@contextmanager
+def trava_arquivo(caminho):
+    # Lock exclusivo entre processos/sessões, feito num arquivo ".lock" ao lado do dado
+    with open(caminho + ".lock", "a+") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# Funções chamadas (dentro do lock) a cada gravação: f(caminho, registros, assinatura_antes, assinatura_depois)
+_ouvintes = []
+
+
+def registrar_ouvinte(funcao):
+    _ouvintes.append(funcao)
+    return funcao
+
+
+# Backend de cada caminho de registros (como configurado, relativo ao diretório de trabalho). Vem da
+# configuração, nunca da extensão: RADIX_SQLITE pode ter qualquer nome. Ferramentas que leem outros caminhos
+# (benchmark) registram o backend deles; fora isso, só um caminho avulso terminado em ".csv" é aceito (como CSV).
+_backends = {}
+
+
+def registrar_backend(caminho, nome):
+    if nome not in BACKENDS:
+        raise ValueError(f"Backend desconhecido: {nome!r}")
+    _backends[os.path.normpath(caminho)] = nome
+
+
+for _nome, _caminho in BACKENDS.items():
+    registrar_backend(_caminho, _nome)
+
+
+def nome_backend(caminho):
+    nome = _backends.get(os.path.normpath(caminho))
+    if nome:
+        return nome
+    if caminho.endswith(".csv"):
+        return "csv"
+    raise ValueError(f"Backend de {caminho} desconhecido: use um CSV ou registre o caminho com registrar_backend")
+
+
+def _backend(caminho):
+    # Módulo que trata o caminho, ou None para o CSV
+    nome = nome_backend(caminho)
+    if nome == "sqlite":
+        import armazenamento_sqlite
+        return armazenamento_sqlite
+    if nome == "parquet":
+        import armazenamento_parquet
+        return armazenamento_parquet
+    return None
+
+
+def assinatura_arquivo(caminho):
+    if _backend(caminho):
+        return _backend(caminho).assinatura(caminho)
+    # No CSV o tamanho é também a posição até onde o arquivo foi lido (ver Leitura)
+    info = os.stat(caminho)
+    return (info.st_mtime_ns, info.st_size, info.st_ino)
+
+
+def _com_ritm(dados):
+    if isinstance(dados, Registro):
+        dados = dados.como_dict()
+    codigo = normalizar_ritm(dados.get("ritm_code")) or extrair_ritm(dados.get("atividade"))
+    return {**dados, "ritm_code": codigo}
+
+
+def _linha(dados):
+    return ["" if dados.get(c) is None else dados.get(c) for c in COLUNAS]
+
+
+# Caminhos (absolutos) já inicializados neste processo: o app chama init_db a cada rerun, mas a migração (e o lock
+# exclusivo que ela pega) só precisa rodar uma vez
+_iniciados = set()
+_iniciados_lock = threading.Lock()
+
+
+def init_db(caminho=FILE_DB):
+    chave = os.path.abspath(caminho)
+    with _iniciados_lock:
+        if chave in _iniciados:
+            return
+        if _backend(caminho):
+            _backend(caminho).init_db(caminho, ARQUIVO_CSV)
+        else:
+            if not os.path.exists(caminho):
+                with trava_arquivo(caminho):
+                    if not os.path.exists(caminho):
+                        with open(caminho, "w", encoding="utf-8", newline="") as f:
+                            csv.writer(f, lineterminator="\n").writerow(COLUNAS)
+            migrar_csv(caminho)
+        _iniciados.add(chave)
+
+
+def _reescrever(caminho, chunksize=200_000):
+    # Reescreve o CSV em blocos no layout de COLUNAS (convertendo linhas do layout antigo), recalculando o
+    # ritm_code; quem chama segura o lock
+    tmp = caminho + ".tmp"
+    total = 0
+    blocos = []
+    if os.path.getsize(caminho) > 0:
+        blocos = pd.read_csv(caminho, dtype=str, keep_default_na=False, chunksize=chunksize)
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        f.write(",".join(COLUNAS) + "\n")
+        for bloco in blocos:
+            bloco = converter_legado(bloco).reindex(columns=COLUNAS, fill_value="")
+            bloco["ritm_code"] = extrair_ritm_series(bloco["atividade"]).fillna("")
+            bloco.to_csv(f, header=False, index=False, lineterminator="\n")
+            total += len(bloco)
+    os.replace(tmp, caminho)
+    return total
+
+
+def normalizar_ritms(caminho=FILE_DB, chunksize=200_000):
+    # Só o CSV: parquet e sqlite já recebem o ritm_code calculado ao gravar e ao importar o CSV
+    if nome_backend(caminho) != "csv":
+        raise ValueError(f"{caminho} não é um CSV: normalizar_ritms só reescreve o histórico em CSV "
+                         f"(o backend {nome_backend(caminho)} já grava o ritm_code)")
+    with trava_arquivo(caminho):
+        return _reescrever(caminho, chunksize)
+
+
+def migrar_csv(caminho=FILE_DB):
+    # Migração única: deixa o CSV antigo no formato esperado pelo append (cabeçalho atual e "\n" no fim),
+    # preenchendo o ritm_code das linhas gravadas antes dele existir e trocando horários em texto por epochs
+    with trava_arquivo(caminho):
+        with open(caminho, "r", encoding="utf-8", newline="") as f:
+            cabecalho = next(csv.reader(f), [])
+        if cabecalho != COLUNAS:
+            _reescrever(caminho)
+            return True
+
+        with open(caminho, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+    return False
+
+
+def salvar_registros(lista_dados, caminho=FILE_DB):
+    global _geracao
+    lista_dados = [_com_ritm(d) for d in lista_dados]
+    linhas = [_linha(d) for d in lista_dados]
+    if not linhas:
+        return 0
+    with trava_arquivo(caminho):
+        antes = assinatura_arquivo(caminho)
+        if _backend(caminho):
+            _backend(caminho).gravar(caminho, lista_dados)
+        else:
+            with open(caminho, "a", encoding="utf-8", newline="") as f:
+                csv.writer(f, lineterminator="\n").writerows(linhas)
+                f.flush()
+                os.fsync(f.fileno())
+        depois = assinatura_arquivo(caminho)
+        for ouvinte in _ouvintes:
+            ouvinte(caminho, lista_dados, antes, depois)
+    with _cache_lock:
+        _geracao += 1
+    return len(linhas)
+
+
+def salvar_registro(dados, caminho=FILE_DB):
+    salvar_registros([dados], caminho)
+
+
+# Protegem o cache de consultar_registros (mais abaixo); _geracao conta as gravações deste processo
+_cache_lock = threading.Lock()
+_geracao = 0
+
+
+def tipar_registros(df):
+    if "segundos_totais" in df:
+        df["segundos_totais"] = pd.to_numeric(df["segundos_totais"], errors="coerce").fillna(0).astype("int64")
+    if "data" in df:
+        df["data"] = pd.to_datetime(df["data"], format="%Y-%m-%d", errors="coerce")
+    return df
+
+
+def _argumentos_leitura(colunas=None):
+    return dict(usecols=colunas, dtype=DTYPES_LEITURA, keep_default_na=False,
+                na_values={"segundos_totais": [""], "ritm_code": [""], "inicio": [""], "fim": [""]})
+
+
+class _Trecho(io.RawIOBase):
+    # Arquivo aberto visto só da posição atual até `fim`: o pandas não enxerga o que for acrescentado durante a leitura
+    def __init__(self, arquivo, fim):
+        self.arquivo = arquivo
+        self.restante = fim - arquivo.tell()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self.arquivo.readinto(memoryview(buffer)[:max(0, min(len(buffer), self.restante))])
+        self.restante -= n
+        return n
+
+
+def _fim_ultima_linha(arquivo, tamanho):
+    # Posição logo depois do último "\n": uma linha ainda sendo gravada fica para a próxima leitura
+    posicao = tamanho
+    while posicao > 0:
+        passo = min(64 * 1024, posicao)
+        arquivo.seek(posicao - passo)
+        quebra = arquivo.read(passo).rfind(b"\n")
+        if quebra >= 0:
+            return posicao - passo + quebra + 1
+        posicao -= passo
+    return 0
+
+
+def _inicio_cauda(arquivo, assinatura, info):
+    # Onde continuar a partir de uma leitura anterior, ou None se o arquivo foi reescrito (outro inode) ou truncado
+    if not assinatura or len(assinatura) != 3:
+        return None
+    _, posicao, inode = assinatura
+    if inode != info.st_ino or not 0 < posicao <= info.st_size:
+        return None
+    arquivo.seek(posicao - 1)
+    return posicao if arquivo.read(1) == b"\n" else None
+
+
+class Leitura:
+    # Uma leitura dos registros junto com a assinatura exata do que foi lido. No CSV (e no sqlite, pelo rowid),
+    # recebendo a assinatura de uma leitura anterior e se desde então só houve acréscimos, lê apenas a cauda
+    # (cauda=True) para o chamador somar ao que já tem; nos outros casos (e no parquet) lê tudo.
+
+    def __init__(self, caminho=FILE_DB, assinatura=None, chunksize=TAMANHO_BLOCO):
+        self.caminho = caminho
+        self.anterior = assinatura
+        self.chunksize = chunksize
+        self.arquivo = None
+        self.cauda = False
+        self.assinatura = None
+        self._trecho = None
+
+    def __enter__(self):
+        if _backend(self.caminho):
+            self.assinatura = assinatura_arquivo(self.caminho)
+            self._trecho = _backend(self.caminho).trecho(self.anterior, self.assinatura)
+            self.cauda = bool(self._trecho and self._trecho[0])
+            return self
+        self.arquivo = open(self.caminho, "rb")
+        info = os.fstat(self.arquivo.fileno())
+        self._fim = _fim_ultima_linha(self.arquivo, info.st_size)
+        # mtime None quando sobrou uma linha incompleta: a próxima comparação falha e a leitura continua dali
+        self.assinatura = (info.st_mtime_ns if self._fim == info.st_size else None, self._fim, info.st_ino)
+        inicio = _inicio_cauda(self.arquivo, self.anterior, info)
+        self.cauda = inicio is not None
+        self._inicio = inicio or 0
+        return self
+
+    def __exit__(self, tipo, valor, traceback):
+        if self.arquivo:
+            self.arquivo.close()
+
+    def argumentos_backend(self):
+        # Intervalo a passar para as funções de leitura do backend (só o sqlite tem)
+        return {"trecho": self._trecho} if self._trecho else {}
+
+    def _ler_csv(self, colunas, texto, chunksize):
+        argumentos = dict(usecols=colunas, dtype=str, keep_default_na=False) if texto else _argumentos_leitura(colunas)
+        if self.cauda:
+            argumentos.update(names=COLUNAS, header=None)
+        self.arquivo.seek(self._inicio)
+        return pd.read_csv(io.BufferedReader(_Trecho(self.arquivo, self._fim)), chunksize=chunksize, **argumentos)
+
+    def blocos(self, colunas=None, texto=False):
+        # texto=True devolve as colunas como str, sem tipar (só CSV)
+        if _backend(self.caminho):
+            yield from _backend(self.caminho).ler_em_blocos(self.caminho, colunas, self.chunksize,
+                                                            **self.argumentos_backend())
+            return
+        if self._fim <= self._inicio:
+            return
+        for bloco in self._ler_csv(colunas, texto, self.chunksize):
+            yield bloco if texto else tipar_registros(bloco)
+
+    def ler(self, colunas=None):
+        if _backend(self.caminho):
+            with medir(f"{_backend(self.caminho).NOME}.{'cauda' if self.cauda else 'ler'}"):
+                return _backend(self.caminho).ler(self.caminho, colunas, **self.argumentos_backend())
+        with medir("csv.cauda" if self.cauda else "csv.ler"):
+            if self._fim <= self._inicio:
+                vazio = pd.read_csv(io.StringIO(",".join(COLUNAS) + "\n"), **_argumentos_leitura(colunas))
+                return tipar_registros(vazio)
+            return tipar_registros(self._ler_csv(colunas, False, None))
+
+
+def _anexar(df, novo):
+    # Frame em cache + linhas novas. As categorias são unificadas antes (concat de categorias diferentes vira object)
+    if novo.empty:
+        return df
+    if df.empty:
+        return novo
+    for coluna in df.columns:
+        if isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            categorias = df[coluna].cat.categories.union(novo[coluna].cat.categories)
+            if not df[coluna].cat.categories.equals(categorias):
+                df = df.assign(**{coluna: df[coluna].cat.set_categories(categorias)})
+            novo[coluna] = novo[coluna].cat.set_categories(categorias)
+    return pd.concat([df, novo], ignore_index=True)
+
+
+def ler_registros(caminho=FILE_DB, colunas=None):
+    with Leitura(caminho) as leitura:
+        return leitura.ler(colunas)
+
+
+def _em_cache(cache, chave, caminho):
+    # (item, geração) do cache; item é None se não existe ou se o arquivo mudou desde que foi guardado
+    with _cache_lock:
+        geracao = _geracao
+        item = cache.get(chave)
+        if item and item[0] == assinatura_arquivo(caminho) + (geracao,):
+            return item, geracao, True
+    return item, geracao, False
+
+
+def _iso(dia):
+    return None if dia is None else pd.Timestamp(dia).strftime("%Y-%m-%d")
+
+
+def _consultar(leitura, usuario, inicio, fim, colunas):
+    caminho = leitura.caminho
+    if _backend(caminho):
+        with medir(f"{_backend(caminho).NOME}.consultar{'.cauda' if leitura.cauda else ''}"):
+            return _backend(caminho).consultar(caminho, usuario, inicio, fim, colunas, **leitura.argumentos_backend())
+    with medir("csv.consultar.cauda" if leitura.cauda else "csv.consultar"):
+        return _consultar_csv(leitura, usuario, inicio, fim, colunas)
+
+
+def _filtrar_csv_em_blocos(leitura, usuario, inicio, fim, colunas):
+    # Lê o CSV em blocos, como texto, e descarta cedo as linhas fora do filtro
+    for bloco in leitura.blocos(list(dict.fromkeys(colunas + ["usuario", "data"])), texto=True):
+        mascara = pd.Series(True, index=bloco.index)
+        if usuario is not None:
+            mascara &= bloco["usuario"] == usuario
+        if inicio is not None:
+            mascara &= bloco["data"] >= inicio
+        if fim is not None:
+            mascara &= bloco["data"] <= fim
+        if mascara.any():
+            yield bloco.loc[mascara, colunas]
+
+
+def tipar_texto(df):
+    for coluna, tipo in DTYPES_LEITURA.items():
+        if coluna in df:
+            if tipo == "Int64":
+                df[coluna] = pd.to_numeric(df[coluna], errors="coerce").astype(tipo)
+            else:
+                df[coluna] = df[coluna].astype(tipo)
+    if "ritm_code" in df:
+        df["ritm_code"] = df["ritm_code"].replace("", pd.NA)
+    return tipar_registros(df)
+
+
+def _consultar_csv(leitura, usuario, inicio, fim, colunas):
+    # Só o que passa no filtro é concatenado e tipado
+    partes = list(_filtrar_csv_em_blocos(leitura, usuario, inicio, fim, colunas))
+    df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=colunas, dtype=str)
+    return tipar_texto(df)
+
+
+def consultar_em_blocos(usuario=None, inicio=None, fim=None, colunas=None, caminho=FILE_DB, chunksize=TAMANHO_BLOCO):
+    # Como consultar_registros, mas entregando o resultado em blocos (exportações grandes)
+    colunas = list(colunas or COLUNAS)
+    inicio, fim = _iso(inicio), _iso(fim)
+    if _backend(caminho):
+        yield from _backend(caminho).consultar_em_blocos(caminho, usuario, inicio, fim, colunas, chunksize)
+        return
+    with Leitura(caminho, chunksize=chunksize) as leitura:
+        for bloco in _filtrar_csv_em_blocos(leitura, usuario, inicio, fim, colunas):
+            yield tipar_texto(bloco)
+
+
+# Resultados recentes de consultar_registros; no CSV, quando o arquivo cresce, só a cauda é filtrada e anexada
+_consultas = OrderedDict()
+MAX_CONSULTAS = 64
+
+
+def consultar_registros(usuario=None, inicio=None, fim=None, colunas=None, caminho=FILE_DB, chunksize=TAMANHO_BLOCO):
+    colunas = list(colunas or COLUNAS)
+    inicio, fim = _iso(inicio), _iso(fim)
+    chave = (caminho, usuario, inicio, fim, tuple(colunas))
+    item, geracao, valido = _em_cache(_consultas, chave, caminho)
+    if valido:
+        with _cache_lock:
+            _consultas.move_to_end(chave)
+        return item[1]
+    with Leitura(caminho, item[0][:-1] if item else None, chunksize) as leitura:
+        df = _consultar(leitura, usuario, inicio, fim, colunas)
+        if leitura.cauda:
+            df = _anexar(item[1], df)
+    with _cache_lock:
+        _consultas[chave] = (leitura.assinatura + (geracao,), df)
+        _consultas.move_to_end(chave)
+        while len(_consultas) > MAX_CONSULTAS:
+            _consultas.popitem(last=False)
+    return df
@@ -0,0 +1,250 @@
+import argparse
+import os
+import time
+import uuid
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+import armazenamento
+from armazenamento import COLUNAS, DTYPES_LEITURA, trava_arquivo, tipar_registros
+from registro import converter_legado
+
+
+NOME = "parquet"
+ARQUIVO_VERSAO = "_versao"
+# Presente nas pastas já no layout com inicio/fim em epoch
+ARQUIVO_LAYOUT = "_layout_epoch"
+
+
+def _exigir_pyarrow():
+    if pa is None:
+        raise RuntimeError("O backend parquet precisa do pacote pyarrow (pip install pyarrow)")
+
+
+def _esquema():
+    return pa.schema([
+        ("usuario", pa.string()),
+        ("atividade", pa.string()),
+        ("inicio", pa.int64()),
+        ("fim", pa.int64()),
+        ("segundos_totais", pa.int64()),
+        ("data", pa.date32()),
+        ("tipo", pa.string()),
+        ("ritm_code", pa.string()),
+    ])
+
+
+def _conjunto(pasta):
+    return ds.dataset(pasta, format="parquet", partitioning="hive", schema=_esquema().append(pa.field("mes", pa.string())))
+
+
+def _marcar_layout(pasta):
+    open(os.path.join(pasta, ARQUIVO_LAYOUT), "w").close()
+
+
+def _bump_versao(pasta):
+    caminho = os.path.join(pasta, ARQUIVO_VERSAO)
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write(str(time.time_ns()))
+
+
+def assinatura(pasta):
+    info = os.stat(os.path.join(pasta, ARQUIVO_VERSAO))
+    return (info.st_mtime_ns, info.st_size)
+
+
+def trecho(anterior, atual):
+    # Os arquivos das partições não têm uma ordem de onde continuar: a leitura é sempre completa
+    return None
+
+
+def init_db(pasta, arquivo_csv=None):
+    _exigir_pyarrow()
+    if os.path.exists(os.path.join(pasta, ARQUIVO_VERSAO)):
+        if not os.path.exists(os.path.join(pasta, ARQUIVO_LAYOUT)):
+            _migrar_layout(pasta)
+        return
+    with trava_arquivo(pasta):
+        os.makedirs(pasta, exist_ok=True)
+        if arquivo_csv and os.path.exists(arquivo_csv):
+            _converter(arquivo_csv, pasta, armazenamento.TAMANHO_BLOCO)
+        _marcar_layout(pasta)
+        _bump_versao(pasta)
+
+
+def _tabela(df):
+    df = df.reindex(columns=COLUNAS)
+    df["data"] = pd.to_datetime(df["data"], format="%Y-%m-%d", errors="coerce").dt.date
+    df["segundos_totais"] = pd.to_numeric(df["segundos_totais"], errors="coerce").fillna(0).astype("int64")
+    for coluna in ("inicio", "fim"):
+        df[coluna] = pd.to_numeric(df[coluna], errors="coerce").astype("Int64")
+    for coluna in COLUNAS:
+        if coluna not in ("data", "segundos_totais", "inicio", "fim"):
+            df[coluna] = df[coluna].astype("string")
+    df["ritm_code"] = df["ritm_code"].replace("", pd.NA)
+    return pa.Table.from_pandas(df, schema=_esquema(), preserve_index=False)
+
+
+def _gravar_arquivo(tabela, destino, sufixo=None):
+    # Grava com um nome que a descoberta do pyarrow ignora (começa com ".") e só então renomeia para part-*.parquet:
+    # uma leitura concorrente (sem lock) nunca encontra um arquivo pela metade
+    nome = f"part-{time.time_ns()}-{sufixo or uuid.uuid4().hex[:8]}.parquet"
+    tmp = os.path.join(destino, f".{nome}.tmp")
+    pq.write_table(tabela, tmp)
+    os.replace(tmp, os.path.join(destino, nome))
+
+
+def _gravar_particoes(df, pasta):
+    # Um arquivo novo por mês tocado: gravar nunca reescreve o que já está no disco
+    meses = pd.to_datetime(df["data"], format="%Y-%m-%d", errors="coerce").dt.strftime("%Y-%m").fillna("sem-data")
+    for mes, parte in df.groupby(meses, sort=False):
+        destino = os.path.join(pasta, f"mes={mes}")
+        os.makedirs(destino, exist_ok=True)
+        _gravar_arquivo(_tabela(parte), destino)
+
+
+def gravar(pasta, registros):
+    # Chamado por armazenamento.salvar_registros já com o lock da pasta
+    _gravar_particoes(pd.DataFrame(registros, columns=COLUNAS), pasta)
+    _bump_versao(pasta)
+
+
+def _para_pandas(tabela):
+    df = tabela.to_pandas(date_as_object=False)
+    for coluna, tipo in DTYPES_LEITURA.items():
+        if coluna in df:
+            serie = df[coluna] if coluna == "ritm_code" or tipo == "Int64" else df[coluna].fillna("")
+            df[coluna] = serie.astype(tipo)
+    return tipar_registros(df)
+
+
+def ler(pasta, colunas=None):
+    return _para_pandas(_conjunto(pasta).to_table(columns=colunas or COLUNAS))
+
+
+def ler_em_blocos(pasta, colunas=None, chunksize=None):
+    for lote in _conjunto(pasta).to_batches(columns=colunas or COLUNAS, batch_size=chunksize or armazenamento.TAMANHO_BLOCO):
+        if lote.num_rows:
+            yield _para_pandas(pa.Table.from_batches([lote]))
+
+
+def _filtro(usuario, inicio, fim):
+    # Filtros empurrados para o leitor; o filtro em "mes" descarta partições inteiras
+    filtro = None
+
+    def e(expr):
+        return expr if filtro is None else filtro & expr
+
+    if usuario is not None:
+        filtro = e(ds.field("usuario") == usuario)
+    if inicio is not None:
+        filtro = e((ds.field("mes") >= inicio[:7]) & (ds.field("data") >= pa.scalar(pd.Timestamp(inicio).date())))
+    if fim is not None:
+        filtro = e((ds.field("mes") <= fim[:7]) & (ds.field("data") <= pa.scalar(pd.Timestamp(fim).date())))
+    return filtro
+
+
+def consultar(pasta, usuario, inicio, fim, colunas):
+    return _para_pandas(_conjunto(pasta).to_table(columns=colunas, filter=_filtro(usuario, inicio, fim)))
+
+
+def consultar_em_blocos(pasta, usuario, inicio, fim, colunas, chunksize=None):
+    lotes = _conjunto(pasta).to_batches(columns=colunas, filter=_filtro(usuario, inicio, fim),
+                                        batch_size=chunksize or armazenamento.TAMANHO_BLOCO)
+    for lote in lotes:
+        if lote.num_rows:
+            yield _para_pandas(pa.Table.from_batches([lote]))
+
+
+def _converter(arquivo_csv, pasta, chunksize):
+    total = 0
+    for bloco in pd.read_csv(arquivo_csv, dtype=str, keep_default_na=False, chunksize=chunksize):
+        bloco = converter_legado(bloco).reindex(columns=COLUNAS, fill_value="")
+        if (bloco["ritm_code"] == "").all():
+            bloco["ritm_code"] = armazenamento.extrair_ritm_series(bloco["atividade"]).fillna("")
+        _gravar_particoes(bloco, pasta)
+        total += len(bloco)
+    return total
+
+
+def converter_csv(arquivo_csv=armazenamento.ARQUIVO_CSV, pasta=armazenamento.PASTA_PARQUET, chunksize=armazenamento.TAMANHO_BLOCO):
+    _exigir_pyarrow()
+    with trava_arquivo(pasta):
+        os.makedirs(pasta, exist_ok=True)
+        total = _converter(arquivo_csv, pasta, chunksize)
+        _compactar(pasta)
+        _marcar_layout(pasta)
+        _bump_versao(pasta)
+    return total
+
+
+def _migrar_layout(pasta):
+    # Arquivos gravados no layout antigo (horários em texto) são regravados com inicio/fim em epoch
+    with trava_arquivo(pasta):
+        migrou = False
+        for raiz, _, arquivos in os.walk(pasta):
+            for nome in sorted(f for f in arquivos if f.endswith(".parquet")):
+                arquivo = os.path.join(raiz, nome)
+                if "hora_fim" not in pq.read_schema(arquivo).names:
+                    continue
+                df = pq.read_table(arquivo).to_pandas()
+                df["data"] = pd.to_datetime(df["data"]).dt.strftime("%Y-%m-%d")
+                df = converter_legado(df.astype({"hora_inicio": str, "hora_fim": str}))
+                _gravar_arquivo(_tabela(df), raiz)
+                os.remove(arquivo)
+                migrou = True
+        _marcar_layout(pasta)
+        if migrou:
+            _bump_versao(pasta)
+
+
+def _compactar(pasta):
+    for nome in sorted(os.listdir(pasta)):
+        particao = os.path.join(pasta, nome)
+        if not (os.path.isdir(particao) and nome.startswith("mes=")):
+            continue
+        partes = sorted(f for f in os.listdir(particao) if f.endswith(".parquet"))
+        if len(partes) <= 1:
+            continue
+        tabela = pa.concat_tables(pq.read_table(os.path.join(particao, f), schema=_esquema()) for f in partes)
+        # O arquivo juntado aparece inteiro antes de as partes saírem
+        _gravar_arquivo(tabela, particao, "compactado")
+        for f in partes:
+            os.remove(os.path.join(particao, f))
+
+
+def compactar(pasta=armazenamento.PASTA_PARQUET):
+    # Junta os arquivos pequenos de cada mês (um por gravação) num só
+    _exigir_pyarrow()
+    with trava_arquivo(pasta):
+        _compactar(pasta)
+        _bump_versao(pasta)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ferramentas do backend parquet")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    conv = sub.add_parser("converter", help="converte o CSV de registros para parquet particionado por mês")
+    conv.add_argument("--csv", default=armazenamento.ARQUIVO_CSV)
+    conv.add_argument("--pasta", default=armazenamento.PASTA_PARQUET)
+    conv.add_argument("--chunksize", type=int, default=armazenamento.TAMANHO_BLOCO)
+    comp = sub.add_parser("compactar", help="junta os arquivos de cada partição mensal")
+    comp.add_argument("--pasta", default=armazenamento.PASTA_PARQUET)
+    args = parser.parse_args()
+
+    if args.comando == "converter":
+        print(f"{converter_csv(args.csv, args.pasta, args.chunksize)} linhas convertidas para {args.pasta}")
+    else:
+        compactar(args.pasta)
+        print(f"{args.pasta} compactado")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+import armazenamento
+from armazenamento import COLUNAS, trava_arquivo
+from registro import converter_legado
+
+
+NOME = "sqlite"
+
+
+# Banco único compartilhado pelas réplicas: registros, tabelas chave/valor e um contador de versão por tabela.
+# O contador é incrementado na mesma transação da gravação; cada réplica compara a versão que viu com a
+# atual (uma leitura de uma linha) e só invalida os caches quando ela mudou.
+# As gravações só acrescentam registros (rowid crescente); o que apaga ou recria a tabela incrementa também
+# REESCRITAS, e aí quem já tinha lido precisa ler tudo de novo em vez de só as linhas novas.
+_local = threading.local()
+_AUSENTE = object()
+REESCRITAS = "registros:reescritas"
+
+TABELA_REGISTROS = [
+    """CREATE TABLE IF NOT EXISTS registros (
+        usuario TEXT, atividade TEXT, inicio INTEGER, fim INTEGER, segundos_totais INTEGER, data TEXT, tipo TEXT,
+        ritm_code TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS registros_data ON registros (data)",
+    "CREATE INDEX IF NOT EXISTS registros_usuario_data ON registros (usuario, data)",
+]
+ESQUEMA = TABELA_REGISTROS + [
+    "CREATE TABLE IF NOT EXISTS chave_valor (tabela TEXT, chave TEXT, valor TEXT, PRIMARY KEY (tabela, chave))",
+    "CREATE TABLE IF NOT EXISTS versoes (nome TEXT PRIMARY KEY, versao INTEGER NOT NULL)",
+]
+
+
+def conectar(caminho):
+    # Uma conexão por thread (cada sessão do Streamlit roda na sua) e por arquivo
+    conexoes = getattr(_local, "conexoes", None)
+    if conexoes is None:
+        conexoes = _local.conexoes = {}
+    conexao = conexoes.get(caminho)
+    if conexao is None:
+        conexao = sqlite3.connect(caminho, timeout=30, isolation_level=None)
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute("PRAGMA synchronous=NORMAL")
+        for comando in ESQUEMA:
+            conexao.execute(comando)
+        conexoes[caminho] = conexao
+    return conexao
+
+
+class _Transacao:
+    # BEGIN IMMEDIATE: pega o lock de escrita do banco já no início, evitando deadlock entre réplicas
+    def __init__(self, caminho):
+        self.conexao = conectar(caminho)
+
+    def __enter__(self):
+        self.conexao.execute("BEGIN IMMEDIATE")
+        return self.conexao
+
+    def __exit__(self, tipo, valor, traceback):
+        self.conexao.execute("COMMIT" if tipo is None else "ROLLBACK")
+
+
+def versao(caminho, nome):
+    linha = conectar(caminho).execute("SELECT versao FROM versoes WHERE nome = ?", (nome,)).fetchone()
+    return linha[0] if linha else None
+
+
+def _incrementar(conexao, nome):
+    conexao.execute("INSERT INTO versoes (nome, versao) VALUES (?, 1) "
+                    "ON CONFLICT (nome) DO UPDATE SET versao = versao + 1", (nome,))
+
+
+def assinatura(caminho):
+    # (versão, reescritas, último rowid) numa consulta só, para os três valores virem do mesmo instante
+    return conectar(caminho).execute(
+        "SELECT (SELECT versao FROM versoes WHERE nome = 'registros'), (SELECT versao FROM versoes WHERE nome = ?), "
+        "(SELECT COALESCE(MAX(rowid), 0) FROM registros)", (REESCRITAS,)).fetchone()
+
+
+def trecho(anterior, atual):
+    # (rowid já lido, último rowid) a ler: só as linhas novas se a tabela não foi reescrita desde a leitura
+    # anterior, senão tudo. O limite de cima deixa de fora o que for gravado depois da assinatura.
+    ultimo = atual[2]
+    if anterior and len(anterior) == 3 and anterior[1] == atual[1] and anterior[2] <= ultimo:
+        return (anterior[2], ultimo)
+    return (0, ultimo)
+
+
+def _layout_antigo(conexao):
+    return "hora_fim" in [linha[1] for linha in conexao.execute("PRAGMA table_info(registros)")]
+
+
+def _migrar_layout(conexao):
+    # Tabela criada com horários em texto: copiada em blocos para o layout com inicio/fim em epoch
+    conexao.execute("DROP INDEX IF EXISTS registros_data")
+    conexao.execute("DROP INDEX IF EXISTS registros_usuario_data")
+    conexao.execute("ALTER TABLE registros RENAME TO registros_antigo")
+    for comando in TABELA_REGISTROS:
+        conexao.execute(comando)
+    for bloco in pd.read_sql_query("SELECT * FROM registros_antigo ORDER BY rowid", conexao,
+                                   chunksize=armazenamento.TAMANHO_BLOCO):
+        _inserir(conexao, converter_legado(bloco.fillna("")))
+    conexao.execute("DROP TABLE registros_antigo")
+    _incrementar(conexao, "registros")
+    _incrementar(conexao, REESCRITAS)
+
+
+def init_db(caminho, arquivo_csv=None):
+    if versao(caminho, "registros") is not None:
+        if _layout_antigo(conectar(caminho)):
+            with trava_arquivo(caminho), _Transacao(caminho) as conexao:
+                if _layout_antigo(conexao):
+                    _migrar_layout(conexao)
+        return
+    with trava_arquivo(caminho), _Transacao(caminho) as conexao:
+        if versao(caminho, "registros") is not None:
+            return
+        if arquivo_csv and os.path.exists(arquivo_csv):
+            _importar_csv(conexao, arquivo_csv, armazenamento.TAMANHO_BLOCO)
+        _incrementar(conexao, "registros")
+
+
+def _valores(df):
+    # Texto vazio vira NULL; na leitura volta a ser "" (ou NA no ritm_code)
+    df = df.reindex(columns=COLUNAS)
+    segundos = pd.to_numeric(df["segundos_totais"], errors="coerce").fillna(0).astype("int64").tolist()
+    df = df.astype(object).where(df.notna() & (df != ""), None)
+    df["segundos_totais"] = segundos
+    return df.itertuples(index=False, name=None)
+
+
+def _inserir(conexao, df):
+    marcadores = ", ".join("?" * len(COLUNAS))
+    conexao.executemany(f"INSERT INTO registros ({', '.join(COLUNAS)}) VALUES ({marcadores})", _valores(df))
+
+
+def gravar(caminho, registros):
+    # Chamado por armazenamento.salvar_registros já com o lock do arquivo
+    with _Transacao(caminho) as conexao:
+        _inserir(conexao, pd.DataFrame(registros, columns=COLUNAS))
+        _incrementar(conexao, "registros")
+
+
+def _importar_csv(conexao, arquivo_csv, chunksize):
+    total = 0
+    for bloco in pd.read_csv(arquivo_csv, dtype=str, keep_default_na=False, chunksize=chunksize):
+        bloco = converter_legado(bloco).reindex(columns=COLUNAS, fill_value="")
+        if (bloco["ritm_code"] == "").all():
+            bloco["ritm_code"] = armazenamento.extrair_ritm_series(bloco["atividade"]).fillna("")
+        _inserir(conexao, bloco)
+        total += len(bloco)
+    return total
+
+
+def _where(usuario, inicio, fim, trecho=None):
+    condicoes, parametros = [], []
+    if trecho is not None:
+        condicoes.append("rowid > ? AND rowid <= ?")
+        parametros.extend(trecho)
+    if usuario is not None:
+        condicoes.append("usuario = ?")
+        parametros.append(usuario)
+    if inicio is not None:
+        condicoes.append("data >= ?")
+        parametros.append(inicio)
+    if fim is not None:
+        condicoes.append("data <= ?")
+        parametros.append(fim)
+    return (" WHERE " + " AND ".join(condicoes) if condicoes else ""), parametros
+
+
+def _blocos(caminho, colunas, usuario, inicio, fim, chunksize, trecho=None):
+    where, parametros = _where(usuario, inicio, fim, trecho)
+    sql = f"SELECT {', '.join(colunas)} FROM registros{where} ORDER BY rowid"
+    for bloco in pd.read_sql_query(sql, conectar(caminho), params=parametros, chunksize=chunksize):
+        yield bloco
+
+
+def _para_pandas(df):
+    for coluna in df.columns:
+        if coluna not in ("segundos_totais", "ritm_code", "inicio", "fim"):
+            df[coluna] = df[coluna].fillna("")
+    return armazenamento.tipar_texto(df)
+
+
+def _juntar(blocos, colunas):
+    partes = list(blocos)
+    df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=colunas)
+    return _para_pandas(df)
+
+
+def ler(caminho, colunas=None, trecho=None):
+    colunas = colunas or COLUNAS
+    return _juntar(_blocos(caminho, colunas, None, None, None, armazenamento.TAMANHO_BLOCO, trecho), colunas)
+
+
+def ler_em_blocos(caminho, colunas=None, chunksize=None, trecho=None):
+    for bloco in _blocos(caminho, colunas or COLUNAS, None, None, None, chunksize or armazenamento.TAMANHO_BLOCO,
+                         trecho):
+        yield _para_pandas(bloco)
+
+
+def consultar(caminho, usuario, inicio, fim, colunas, trecho=None):
+    return _juntar(_blocos(caminho, colunas, usuario, inicio, fim, armazenamento.TAMANHO_BLOCO, trecho), colunas)
+
+
+def consultar_em_blocos(caminho, usuario, inicio, fim, colunas, chunksize=None):
+    for bloco in _blocos(caminho, colunas, usuario, inicio, fim, chunksize or armazenamento.TAMANHO_BLOCO):
+        yield _para_pandas(bloco)
+
+
+class TabelaChaveValor:
+    # Mesma interface de chave_valor.ArquivoJson, guardada na tabela chave_valor do banco.
+    # A cópia em memória só é relida quando a versão da tabela muda (gravação de qualquer réplica).
+
+    def __init__(self, caminho, tabela, arquivo_json=None):
+        self.caminho = caminho
+        self.tabela = tabela
+        self.arquivo_json = arquivo_json
+        self.lock = threading.Lock()
+        self._versao = None
+        self._dados = {}
+
+    def _nome_versao(self):
+        return f"chave_valor:{self.tabela}"
+
+    def _ler(self):
+        atual = versao(self.caminho, self._nome_versao())
+        if atual != self._versao:
+            linhas = conectar(self.caminho).execute(
+                "SELECT chave, valor FROM chave_valor WHERE tabela = ?", (self.tabela,))
+            self._dados = {chave: json.loads(valor) for chave, valor in linhas}
+            self._versao = atual
+        return self._dados
+
+    def _gravar(self, conexao, dados, anteriores):
+        for chave in anteriores.keys() - dados.keys():
+            conexao.execute("DELETE FROM chave_valor WHERE tabela = ? AND chave = ?", (self.tabela, chave))
+        alterados = [(self.tabela, chave, json.dumps(valor, ensure_ascii=False))
+                     for chave, valor in dados.items() if anteriores.get(chave, _AUSENTE) != valor]
+        conexao.executemany("INSERT OR REPLACE INTO chave_valor (tabela, chave, valor) VALUES (?, ?, ?)", alterados)
+        _incrementar(conexao, self._nome_versao())
+
+    def inicializar(self, padrao):
+        # Na primeira vez, importa o JSON local (se houver) para o banco
+        if versao(self.caminho, self._nome_versao()) is not None:
+            return
+        with self.lock, _Transacao(self.caminho) as conexao:
+            if versao(self.caminho, self._nome_versao()) is not None:
+                return
+            if self.arquivo_json and os.path.exists(self.arquivo_json):
+                with open(self.arquivo_json, "r", encoding="utf-8") as f:
+                    padrao = json.load(f)
+            self._gravar(conexao, padrao, {})
+
+    def carregar(self):
+        with self.lock:
+            return self._ler()
+
+    def obter(self, chave, padrao=None):
+        return self.carregar().get(chave, padrao)
+
+    def atualizar(self, funcao):
+        # Lê a versão mais recente, aplica funcao(dados) numa cópia e grava, tudo na mesma transação
+        with self.lock, _Transacao(self.caminho) as conexao:
+            self._versao = None
+            anteriores = self._ler()
+            dados = dict(anteriores)
+            funcao(dados)
+            self._gravar(conexao, dados, anteriores)
+            self._dados = dados
+            self._versao = versao(self.caminho, self._nome_versao())
+            return dados
+
+    def definir(self, chave, valor):
+        return self.atualizar(lambda dados: dados.__setitem__(chave, valor))
+
+    def remover(self, chave):
+        return self.atualizar(lambda dados: dados.pop(chave, None))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa o CSV de registros para o banco SQLite compartilhado")
+    parser.add_argument("--csv", default=armazenamento.ARQUIVO_CSV)
+    parser.add_argument("--banco", default=armazenamento.ARQUIVO_SQLITE)
+    parser.add_argument("--chunksize", type=int, default=armazenamento.TAMANHO_BLOCO)
+    args = parser.parse_args()
+
+    with trava_arquivo(args.banco), _Transacao(args.banco) as conexao:
+        conexao.execute("DELETE FROM registros")
+        total = _importar_csv(conexao, args.csv, args.chunksize)
+        _incrementar(conexao, "registros")
+        _incrementar(conexao, REESCRITAS)
+    print(f"{total} linhas importadas para {args.banco}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+import argparse
+import csv
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import date, datetime, time as dt_time, timedelta
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import armazenamento
+import credenciais
+from armazenamento import _iso
+from registro import Registro
+from ritm import extrair_ritm, extrair_ritm_series
+
+
+def gerar_historico(caminho, linhas, usuarios=300, ritms=2000, seed=42):
+    rnd = random.Random(seed)
+    nomes = [f"user{i:03d}" for i in range(usuarios)]
+    atividades = ["Codando", "Reunião", "Daily Radix", "Acessos", "Revisão das Telas", "KT"]
+    inicio = date.today() - timedelta(days=999)
+    armazenamento.init_db(caminho)
+    lote = []
+    for i in range(linhas):
+        segs = rnd.randint(60, 4 * 3600)
+        atividade = rnd.choice(atividades)
+        if rnd.random() < 0.3:
+            atividade = f"{atividade} [RITM{rnd.randint(100000, 100000 + ritms)}]"
+        dia = inicio + timedelta(days=i * 1000 // max(linhas, 1))
+        comeco = int(datetime.combine(dia, dt_time(9)).timestamp())
+        lote.append({
+            "usuario": rnd.choice(nomes),
+            "atividade": atividade,
+            "inicio": comeco,
+            "fim": comeco + segs,
+            "segundos_totais": segs,
+            "data": dia.isoformat(),
+            "tipo": "timer",
+        })
+        if len(lote) >= 50_000:
+            armazenamento.salvar_registros(lote, caminho)
+            lote = []
+    armazenamento.salvar_registros(lote, caminho)
+
+
+def _registro_exemplo():
+    fim = datetime.combine(date.today(), dt_time(9, 30))
+    return Registro.intervalo("bench", "Benchmark [RITM999999]", fim - timedelta(minutes=30), fim, "manual").como_dict()
+
+
+def _salvar_antigo(dados, caminho):
+    df = pd.read_csv(caminho)
+    df = pd.concat([df, pd.DataFrame([dados])], ignore_index=True)
+    df.to_csv(caminho, index=False)
+
+
+def _medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - t0)
+    return tempos
+
+
+def _percentil(tempos, p):
+    return tempos[min(len(tempos) - 1, int(len(tempos) * p))]
+
+
+def _relatorio(nome, tempos, memoria=None):
+    tempos = sorted(tempos)
+    extra = f"  pico={memoria:7.1f} MB" if memoria is not None else ""
+    print(f"{nome:<32} n={len(tempos):<6} média={statistics.mean(tempos) * 1000:9.3f} ms  "
+          f"p50={_percentil(tempos, 0.5) * 1000:9.3f} ms  p95={_percentil(tempos, 0.95) * 1000:9.3f} ms  "
+          f"p99={_percentil(tempos, 0.99) * 1000:9.3f} ms  ({len(tempos) / sum(tempos):,.0f} ops/s){extra}")
+
+
+def _pico_memoria(funcao):
+    # Pico de memória alocada (MB) durante uma execução de funcao
+    tracemalloc.start()
+    try:
+        funcao()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+@contextmanager
+def ambiente_sintetico(linhas, usuarios=300, ritms=2000):
+    # Pasta temporária com histórico, usuarios.json e ritms_status.json sintéticos; o cwd vira essa pasta
+    anterior = os.getcwd()
+    with tempfile.TemporaryDirectory() as pasta:
+        os.chdir(pasta)
+        try:
+            gerar_historico(armazenamento.ARQUIVO_CSV, linhas, usuarios, ritms)
+            senha_hash = credenciais.gerar_hash("1234")
+            cadastro = {f"user{i:03d}": {"nome": f"Usuário {i}", "senha_hash": senha_hash, "cargo": "funcionario", "foto": ""}
+                        for i in range(usuarios)}
+            cadastro["admin"] = {"nome": "Gerente", "senha_hash": senha_hash, "cargo": "chefe", "foto": ""}
+            with open("usuarios.json", "w", encoding="utf-8") as f:
+                json.dump(cadastro, f)
+            rnd = random.Random(1)
+            with open("ritms_status.json", "w", encoding="utf-8") as f:
+                json.dump({f"RITM{100000 + i}": "Fechado" for i in range(ritms) if rnd.random() < 0.5}, f)
+            yield pasta
+        finally:
+            os.chdir(anterior)
+
+
+def bench_escrita(linhas, repeticoes, repeticoes_antigo):
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "historico.csv")
+        t0 = time.perf_counter()
+        gerar_historico(caminho, linhas)
+        print(f"Histórico sintético: {linhas:,} linhas em {time.perf_counter() - t0:.1f}s "
+              f"({os.path.getsize(caminho) / 1e6:.1f} MB)")
+
+        dados = _registro_exemplo()
+        _relatorio("salvar_registro (append)", _medir(lambda: armazenamento.salvar_registro(dados, caminho), repeticoes))
+        if repeticoes_antigo:
+            _relatorio("read-concat-rewrite (antigo)", _medir(lambda: _salvar_antigo(dados, caminho), repeticoes_antigo))
+
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+
+def bench_timers(sessoes, segundos):
+    # Abre N sessões com cronômetro rodando e mede o custo do servidor enquanto elas ficam paradas
+    from streamlit.testing.v1 import AppTest
+
+    abertas = []
+    tempos = []
+    threads_antes = threading.active_count()
+    for i in range(sessoes):
+        at = AppTest.from_file(APP, default_timeout=30)
+        at.session_state["logged_in"] = True
+        at.session_state["usuario_info"] = {"nome": f"Bench {i}", "cargo": "funcionario", "user_id": f"bench{i:03d}"}
+        at.session_state["timer_status"] = "rodando"
+        at.session_state["inicio_tempo"] = time.time()
+        at.session_state["atividade_atual"] = "Benchmark"
+        t0 = time.perf_counter()
+        at.run()
+        tempos.append(time.perf_counter() - t0)
+        abertas.append(at)
+
+    cpu0 = time.process_time()
+    time.sleep(segundos)
+    cpu = time.process_time() - cpu0
+
+    _relatorio(f"render c/ cronômetro ({sessoes} sessões)", tempos)
+    print(f"Com {len(abertas)} cronômetros rodando por {segundos}s: CPU do servidor={cpu * 1000:.1f} ms, "
+          f"threads extras={threading.active_count() - threads_antes}")
+
+
+def bench_ritm(tamanhos):
+    rnd = random.Random(7)
+    base = ["Codando", "Reunião [RITM123456]", "Demanda ritm-98765 urgente", "Daily Radix", "KT RITM40028922"]
+    for n in tamanhos:
+        serie = pd.Series([rnd.choice(base) if rnd.random() < 0.7 else f"Demanda [RITM-{rnd.randint(100000, 120000)}]"
+                           for _ in range(n)], dtype="string")
+        t0 = time.perf_counter()
+        por_linha = serie.apply(extrair_ritm)
+        t_apply = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        vetorizado = extrair_ritm_series(serie)
+        t_vet = time.perf_counter() - t0
+        iguais = (por_linha.fillna("") == vetorizado.fillna("")).all()
+        print(f"extrair_ritm {n:>11,} linhas: apply={t_apply:7.2f}s  vetorizado={t_vet:7.2f}s  "
+              f"({t_apply / t_vet:4.1f}x)  resultados iguais={iguais}")
+
+
+def _sessao(usuario, cargo):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=300)
+    at.session_state["logged_in"] = True
+    at.session_state["usuario_info"] = {"nome": usuario, "cargo": cargo, "user_id": usuario}
+    return at
+
+
+def _login(usuario):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=300)
+    at.run()
+    at.text_input[0].set_value(usuario)
+    at.text_input[1].set_value("1234")
+    at.button[0].click()
+    return at
+
+
+def bench_app(tamanhos, renders):
+    # Latência (p50/p95/p99) e pico de memória das telas do app para históricos de tamanhos diferentes
+    from resumos import indice_ritm
+
+    for linhas in tamanhos:
+        with ambiente_sintetico(linhas):
+            print(f"--- histórico de {linhas:,} linhas ---")
+            rnd = random.Random(3)
+            usuarios = [f"user{rnd.randrange(300):03d}" for _ in range(renders)]
+
+            t0 = time.perf_counter()
+            _sessao("admin", "chefe").run()
+            print(f"primeira carga (cache frio): {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+            logins = [_login(u) for u in usuarios]
+            _relatorio("login", _medir(lambda: logins.pop().run(), renders))
+
+            for nome, usuario, cargo in (("funcionario_dashboard", usuarios[0], "funcionario"),
+                                         ("chefe_dashboard", "admin", "chefe")):
+                at = _sessao(usuario, cargo)
+                tempos = _medir(at.run, renders)
+                erros = [e.value for e in at.exception]
+                _relatorio(nome, tempos, _pico_memoria(at.run))
+                if erros:
+                    print(f"  exceções: {erros}")
+
+            def aba_ritm_funcionario():
+                u = rnd.choice(usuarios)
+                indice_ritm.resumo_usuario(u)
+
+            _relatorio("aba RITM (funcionário)", _medir(aba_ritm_funcionario, renders), _pico_memoria(aba_ritm_funcionario))
+            _relatorio("aba RITM (chefe)", _medir(indice_ritm.resumo, renders), _pico_memoria(indice_ritm.resumo))
+
+            dados = _registro_exemplo()
+            salvar = lambda: armazenamento.salvar_registro(dados)
+            _relatorio("salvar_registro", _medir(salvar, renders * 10), _pico_memoria(salvar))
+
+    if resource:
+        print(f"Pico de RSS do processo: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+
+def _tamanho(caminho):
+    if os.path.isfile(caminho):
+        return os.path.getsize(caminho)
+    return sum(os.path.getsize(os.path.join(raiz, f)) for raiz, _, arquivos in os.walk(caminho) for f in arquivos)
+
+
+def _consultar_dia(caminho, dia, colunas):
+    # Consulta sem o cache de consultar_registros
+    with armazenamento.Leitura(caminho) as leitura:
+        return armazenamento._consultar(leitura, None, _iso(dia), _iso(dia), colunas)
+
+
+def bench_parquet(linhas, repeticoes=3):
+    import armazenamento_parquet
+
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo_csv = os.path.join(pasta, "historico.csv")
+        pasta_parquet = os.path.join(pasta, "historico_parquet")
+        gerar_historico(arquivo_csv, linhas)
+        t0 = time.perf_counter()
+        armazenamento_parquet.converter_csv(arquivo_csv, pasta_parquet)
+        armazenamento.registrar_backend(pasta_parquet, "parquet")
+        print(f"Conversão CSV -> parquet de {linhas:,} linhas: {time.perf_counter() - t0:.1f}s")
+        print(f"Tamanho em disco: CSV={_tamanho(arquivo_csv) / 1e6:.1f} MB  parquet={_tamanho(pasta_parquet) / 1e6:.1f} MB")
+
+        dia = armazenamento.ler_registros(arquivo_csv, ["data"])["data"].max()
+        colunas_chefe = ["usuario", "atividade", "segundos_totais", "data"]
+        for nome, caminho in (("csv", arquivo_csv), ("parquet", pasta_parquet)):
+            _relatorio(f"carga completa ({nome})", _medir(lambda: armazenamento.ler_registros(caminho), repeticoes))
+            _relatorio(f"consulta de um dia ({nome})",
+                       _medir(lambda: _consultar_dia(caminho, dia, colunas_chefe), repeticoes))
+
+
+def _anexar_externo(caminho, dados):
+    # Grava como outra réplica faria: direto no arquivo, sem passar pelos ouvintes deste processo
+    with armazenamento.trava_arquivo(caminho), open(caminho, "a", encoding="utf-8", newline="") as f:
+        csv.writer(f, lineterminator="\n").writerow(armazenamento._linha(armazenamento._com_ritm(dados)))
+
+
+def bench_cauda(linhas, repeticoes):
+    # Painel do chefe enquanto outra réplica finaliza tarefas: a cada iteração uma linha nova chega por fora
+    from resumos import IndiceRitm, ResumoDiario
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "historico.csv")
+        gerar_historico(caminho, linhas)
+        resumo, indice = ResumoDiario(caminho), IndiceRitm(caminho)
+        dados = _registro_exemplo()
+        dia = date.today()
+
+        def painel():
+            resumo.datas()
+            resumo.total_dia(dia)
+            indice.resumo()
+            armazenamento.consultar_registros(None, dia, dia, caminho=caminho)
+
+        def releitura_completa():
+            _anexar_externo(caminho, dados)
+            resumo.reconstruir()
+            indice.reconstruir()
+            armazenamento._consultas.clear()
+            painel()
+
+        def cauda():
+            _anexar_externo(caminho, dados)
+            painel()
+
+        painel()
+        _relatorio("painel do chefe após linha externa (releitura completa)", _medir(releitura_completa, min(repeticoes, 5)))
+        _relatorio("painel do chefe após linha externa (cauda)", _medir(cauda, repeticoes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do Radix Time Tracker")
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--repeticoes", type=int, default=1000)
+    parser.add_argument("--repeticoes-antigo", type=int, default=3)
+    parser.add_argument("--cronometros", type=int, default=0,
+                        help="número de sessões simultâneas com cronômetro rodando (0 = pular)")
+    parser.add_argument("--ritm-linhas", type=int, nargs="*", default=[],
+                        help="tamanhos para comparar extrair_ritm via apply x vetorizado (ex.: 100000 1000000 10000000)")
+    parser.add_argument("--parquet", action="store_true", help="compara carga e tamanho do CSV com o backend parquet")
+    parser.add_argument("--app", type=int, nargs="*", default=[],
+                        help="tamanhos de histórico para medir login, dashboards, abas RITM e salvar_registro via AppTest "
+                             "(ex.: 10000 100000 1000000)")
+    parser.add_argument("--renders", type=int, default=20, help="repetições por tela em --app")
+    parser.add_argument("--escrita", action="store_true", help="mede salvar_registro x reescrita completa")
+    parser.add_argument("--cauda", action="store_true",
+                        help="mede o painel do chefe com linhas chegando por fora (cauda x releitura completa)")
+    args = parser.parse_args()
+    if args.escrita or not (args.cronometros or args.ritm_linhas or args.parquet or args.app or args.cauda):
+        bench_escrita(args.linhas, args.repeticoes, args.repeticoes_antigo)
+    if args.parquet:
+        bench_parquet(args.linhas)
+    if args.cauda:
+        bench_cauda(args.linhas, args.repeticoes)
+    if args.ritm_linhas:
+        bench_ritm(args.ritm_linhas)
+    if args.cronometros:
+        with ambiente_sintetico(10_000):
+            bench_timers(args.cronometros, 2)
+    if args.app:
+        bench_app(args.app, args.renders)
+
+
+if __name__ == "__main__":
+    main()
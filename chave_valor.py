@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+
+import armazenamento
+from armazenamento import trava_arquivo
+
+
+class ArquivoJson:
+    # Dicionário persistido num arquivo JSON: leitura em cache (invalidada por mtime/tamanho),
+    # gravação atômica (arquivo temporário + rename) e lock entre processos em cada alteração.
+    # O dicionário devolvido por carregar() é compartilhado: não alterar, usar definir/atualizar.
+
+    def __init__(self, caminho, indent=None):
+        self.caminho = caminho
+        self.indent = indent
+        self.lock = threading.Lock()
+        self._assinatura = None
+        self._dados = {}
+
+    def _assinatura_atual(self):
+        info = os.stat(self.caminho)
+        return (info.st_mtime_ns, info.st_size)
+
+    def _ler(self):
+        assinatura = self._assinatura_atual()
+        if assinatura != self._assinatura:
+            with open(self.caminho, "r", encoding="utf-8") as f:
+                self._dados = json.load(f)
+            self._assinatura = assinatura
+        return self._dados
+
+    def _gravar(self, dados):
+        tmp = f"{self.caminho}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(dados, f, indent=self.indent, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.caminho)
+        self._dados = dados
+        self._assinatura = self._assinatura_atual()
+
+    def inicializar(self, padrao):
+        if os.path.exists(self.caminho):
+            return
+        with trava_arquivo(self.caminho), self.lock:
+            if not os.path.exists(self.caminho):
+                self._gravar(padrao)
+
+    def carregar(self):
+        with self.lock:
+            return self._ler()
+
+    def obter(self, chave, padrao=None):
+        return self.carregar().get(chave, padrao)
+
+    def atualizar(self, funcao):
+        # Lê a versão mais recente, aplica funcao(dados) numa cópia e grava, tudo sob o lock do arquivo
+        with trava_arquivo(self.caminho), self.lock:
+            dados = dict(self._ler())
+            funcao(dados)
+            self._gravar(dados)
+            return dados
+
+    def definir(self, chave, valor):
+        return self.atualizar(lambda dados: dados.__setitem__(chave, valor))
+
+    def remover(self, chave):
+        return self.atualizar(lambda dados: dados.pop(chave, None))
+
+
+FILE_USERS = "usuarios.json"
+FILE_RITM_STATUS = "ritms_status.json"
+FILE_TIMERS = "timers_ativos.json"
+
+def _criar(caminho, indent=None):
+    # Com o backend sqlite as tabelas ficam no banco compartilhado (o JSON local só é importado na primeira vez)
+    if armazenamento.BACKEND == "sqlite":
+        from armazenamento_sqlite import TabelaChaveValor
+        return TabelaChaveValor(armazenamento.ARQUIVO_SQLITE, os.path.splitext(caminho)[0], caminho)
+    return ArquivoJson(caminho, indent)
+
+
+# Instâncias do processo: sobrevivem aos reruns do Streamlit (app.py é reexecutado, este módulo não)
+usuarios_db = _criar(FILE_USERS, indent=4)
+status_ritm_db = _criar(FILE_RITM_STATUS)
+timers_db = _criar(FILE_TIMERS)
@@ -0,0 +1,49 @@
+import hashlib
+import hmac
+import os
+
+
+# Senhas guardadas como "pbkdf2_sha256$iterações$sal$hash" no campo senha_hash do usuarios.json
+ALGORITMO = "pbkdf2_sha256"
+ITERACOES = 100_000
+
+
+def gerar_hash(senha, iteracoes=ITERACOES):
+    sal = os.urandom(16).hex()
+    derivada = hashlib.pbkdf2_hmac("sha256", senha.encode("utf-8"), bytes.fromhex(sal), iteracoes)
+    return f"{ALGORITMO}${iteracoes}${sal}${derivada.hex()}"
+
+
+def verificar_senha(senha, cadastro):
+    # Aceita também a senha em texto puro de cadastros ainda não migrados
+    armazenado = cadastro.get("senha_hash")
+    if armazenado is None:
+        return "senha" in cadastro and hmac.compare_digest(str(cadastro["senha"]).encode("utf-8"), senha.encode("utf-8"))
+    try:
+        algoritmo, iteracoes, sal, esperado = armazenado.split("$")
+    except ValueError:
+        return False
+    if algoritmo != ALGORITMO:
+        return False
+    derivada = hashlib.pbkdf2_hmac("sha256", senha.encode("utf-8"), bytes.fromhex(sal), int(iteracoes))
+    return hmac.compare_digest(derivada.hex(), esperado)
+
+
+def precisa_migrar(usuarios):
+    return any("senha" in cadastro for cadastro in usuarios.values())
+
+
+def migrar_senhas(usuarios):
+    # Troca in-place as senhas em texto puro por senha_hash (usado com ArquivoJson.atualizar)
+    for user, cadastro in usuarios.items():
+        if "senha" in cadastro:
+            cadastro = dict(cadastro)
+            senha = str(cadastro.pop("senha"))
+            if "senha_hash" not in cadastro:
+                cadastro["senha_hash"] = gerar_hash(senha)
+            usuarios[user] = cadastro
+
+
+def dados_publicos(cadastro):
+    # Cópia do cadastro sem as credenciais, para guardar na sessão
+    return {k: v for k, v in cadastro.items() if k not in ("senha", "senha_hash")}
@@ -0,0 +1,43 @@
+import io
+import os
+import threading
+
+from PIL import Image
+
+
+# Miniaturas já decodificadas e redimensionadas, compartilhadas por todas as sessões;
+# a entrada é refeita só quando o arquivo de origem muda (mtime/tamanho)
+_cache = {}
+_lock = threading.Lock()
+
+
+def _gerar(caminho, largura):
+    with Image.open(caminho) as imagem:
+        imagem.thumbnail((largura, largura * 4))
+        destino = io.BytesIO()
+        if imagem.mode in ("RGBA", "LA", "P"):
+            imagem.save(destino, format="PNG", optimize=True)
+        else:
+            imagem.convert("RGB").save(destino, format="JPEG", quality=85)
+    return destino.getvalue()
+
+
+def miniatura(caminho, largura):
+    # Bytes da imagem com no máximo `largura` px de largura, ou None se o arquivo não existir/não abrir
+    try:
+        info = os.stat(caminho)
+    except OSError:
+        return None
+    chave = (caminho, largura)
+    assinatura = (info.st_mtime_ns, info.st_size)
+    with _lock:
+        item = _cache.get(chave)
+        if item and item[0] == assinatura:
+            return item[1]
+    try:
+        dados = _gerar(caminho, largura)
+    except OSError:
+        return None
+    with _lock:
+        _cache[chave] = (assinatura, dados)
+    return dados
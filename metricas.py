@@ -0,0 +1,84 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Destinos opcionais: log estruturado (uma linha JSON por rerun) e arquivo texto no formato Prometheus
+ARQUIVO_LOG = os.environ.get("RADIX_METRICAS_LOG")
+ARQUIVO_PROMETHEUS = os.environ.get("RADIX_METRICAS_PROM")
+
+# Cada sessão do Streamlit roda o script na sua própria thread: as etapas do rerun atual ficam em thread-local
+_local = threading.local()
+_lock = threading.Lock()
+_acumulado = {}
+
+
+def iniciar_rerun():
+    _local.etapas = []
+    _local.inicio = time.perf_counter()
+
+
+def etapas_rerun():
+    return list(getattr(_local, "etapas", []))
+
+
+def _registrar(etapa, segundos):
+    if hasattr(_local, "etapas"):
+        _local.etapas.append((etapa, segundos))
+    with _lock:
+        item = _acumulado.setdefault(etapa, [0, 0.0, 0.0])
+        item[0] += 1
+        item[1] += segundos
+        item[2] = max(item[2], segundos)
+
+
+@contextmanager
+def medir(etapa):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _registrar(etapa, time.perf_counter() - t0)
+
+
+def resumo():
+    # etapa -> (chamadas, segundos totais, maior duração)
+    with _lock:
+        return {etapa: tuple(v) for etapa, v in _acumulado.items()}
+
+
+def texto_prometheus():
+    # O summary só admite _count/_sum (e quantis): o máximo vai numa família gauge à parte
+    etapas = sorted(resumo().items())
+    linhas = [
+        "# HELP radix_etapa_segundos Tempo gasto por etapa do rerun",
+        "# TYPE radix_etapa_segundos summary",
+    ]
+    for etapa, (chamadas, total, _) in etapas:
+        linhas.append(f'radix_etapa_segundos_count{{etapa="{etapa}"}} {chamadas}')
+        linhas.append(f'radix_etapa_segundos_sum{{etapa="{etapa}"}} {total:.6f}')
+    linhas += [
+        "# HELP radix_etapa_segundos_max Maior tempo de uma chamada da etapa desde o início do processo",
+        "# TYPE radix_etapa_segundos_max gauge",
+    ]
+    for etapa, (_, _, maximo) in etapas:
+        linhas.append(f'radix_etapa_segundos_max{{etapa="{etapa}"}} {maximo:.6f}')
+    return "\n".join(linhas) + "\n"
+
+
+def finalizar_rerun(contexto=None):
+    if not hasattr(_local, "inicio"):
+        return
+    _registrar("rerun", time.perf_counter() - _local.inicio)
+    if ARQUIVO_LOG:
+        evento = {"ts": time.time(), **(contexto or {}),
+                  "etapas": [{"etapa": e, "ms": round(s * 1000, 3)} for e, s in _local.etapas]}
+        with _lock, open(ARQUIVO_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(evento, ensure_ascii=False) + "\n")
+    if ARQUIVO_PROMETHEUS:
+        tmp = f"{ARQUIVO_PROMETHEUS}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(texto_prometheus())
+        os.replace(tmp, ARQUIVO_PROMETHEUS)
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+from dateutil import tz
+
+
+# Horários gravados como epoch em segundos (inteiro); "HH:MM:SS" e a duração formatada só existem na exibição
+FUSO = tz.tzlocal()
+_EPOCH = pd.Timestamp(0, tz="UTC")
+
+
+def _epoch(valor):
+    if isinstance(valor, datetime):
+        return int(valor.timestamp())
+    return int(valor)
+
+
+class Registro:
+    # Uma linha do registro de atividades. inicio é None quando não se sabe o começo real
+    # (timer finalizado enquanto pausado: só o tempo acumulado é conhecido).
+    __slots__ = ("usuario", "atividade", "inicio", "fim", "segundos_totais", "data", "tipo", "ritm_code")
+
+    def __init__(self, usuario, atividade, inicio, fim, segundos_totais, data, tipo, ritm_code=None):
+        self.usuario = usuario
+        self.atividade = atividade
+        self.inicio = None if inicio is None else _epoch(inicio)
+        self.fim = _epoch(fim)
+        self.segundos_totais = int(segundos_totais)
+        self.data = data
+        self.tipo = tipo
+        self.ritm_code = ritm_code
+
+    @classmethod
+    def intervalo(cls, usuario, atividade, inicio, fim, tipo, segundos=None):
+        # inicio/fim como time.time() ou datetime local; sem segundos, a duração é fim - inicio.
+        # A data do registro é a do fim.
+        fim = _epoch(fim)
+        inicio = None if inicio is None else _epoch(inicio)
+        if segundos is None:
+            segundos = fim - inicio
+        return cls(usuario, atividade, inicio, fim, segundos, datetime.fromtimestamp(fim).date().isoformat(), tipo)
+
+    @property
+    def duracao_formatada(self):
+        return formatar_duracao(self.segundos_totais)
+
+    def como_dict(self):
+        return {campo: getattr(self, campo) for campo in self.__slots__}
+
+    def __repr__(self):
+        return f"Registro({self.como_dict()!r})"
+
+
+def formatar_duracao(segundos):
+    return str(timedelta(seconds=int(segundos)))
+
+
+def hora_local(epochs):
+    # Series de epochs (Int64, com NA) -> "HH:MM:SS" no fuso local; sem horário vira "N/A"
+    horas = pd.to_datetime(epochs.astype("float64"), unit="s", utc=True).dt.tz_convert(FUSO)
+    return horas.dt.strftime("%H:%M:%S").fillna("N/A").astype("string")
+
+
+def para_exibicao(df):
+    # Nova tabela com inicio/fim trocados por hora_inicio/hora_fim e a duração formatada antes de segundos_totais
+    colunas = {}
+    for coluna in df.columns:
+        if coluna == "inicio":
+            colunas["hora_inicio"] = hora_local(df["inicio"])
+        elif coluna == "fim":
+            colunas["hora_fim"] = hora_local(df["fim"])
+        else:
+            if coluna == "segundos_totais":
+                colunas["duracao_formatada"] = df["segundos_totais"].map(formatar_duracao).astype("string")
+            colunas[coluna] = df[coluna]
+    return pd.DataFrame(colunas, index=df.index)
+
+
+def _epoch_local(datas, horas):
+    momentos = pd.to_datetime(datas.astype(str) + " " + horas.astype(str), format="%Y-%m-%d %H:%M:%S", errors="coerce")
+    momentos = momentos.dt.tz_localize(FUSO, ambiguous="NaT", nonexistent="shift_forward")
+    return (momentos - _EPOCH).dt.total_seconds().round().astype("Int64")
+
+
+def converter_legado(df):
+    # Bloco (texto) no layout antigo -> layout atual: hora_inicio/hora_fim viram epochs, segundos (float) viram
+    # inteiro e duracao_formatada sai. hora_inicio "N/A" ou vazia fica sem início; um início depois do fim é de
+    # um timer que passou da meia-noite e volta um dia.
+    if "hora_fim" not in df:
+        return df
+    df = df.copy()
+    fim = _epoch_local(df["data"], df["hora_fim"])
+    inicio = _epoch_local(df["data"], df.get("hora_inicio", pd.Series("", index=df.index)))
+    df["inicio"] = inicio.where(~(inicio > fim).fillna(False), inicio - 86400)
+    df["fim"] = fim
+    df["segundos_totais"] = pd.to_numeric(df["segundos_totais"], errors="coerce").fillna(0).astype("int64")
+    return df.drop(columns=["hora_inicio", "hora_fim", "duracao_formatada"], errors="ignore")
@@ -0,0 +1,225 @@
+import threading
+from datetime import date, timedelta
+
+import pandas as pd
+
+import armazenamento
+from armazenamento import FILE_DB
+from metricas import medir
+
+
+def _para_data(valor):
+    if isinstance(valor, pd.Timestamp):
+        return None if pd.isna(valor) else valor.date()
+    if isinstance(valor, date):
+        return valor
+    try:
+        return date.fromisoformat(str(valor))
+    except ValueError:
+        return None
+
+
+def _para_segundos(valor):
+    try:
+        return int(float(valor))
+    except (TypeError, ValueError):
+        return 0
+
+
+class AgregadoIncremental:
+    # Base dos agregados em memória: atualizados a cada salvar_registro deste processo; quando o CSV cresce por
+    # fora (outro processo/réplica) só as linhas novas são lidas, e a reconstrução completa fica para reescritas.
+
+    colunas = None
+
+    def __init__(self, caminho=FILE_DB):
+        self.caminho = caminho
+        self.assinatura = None
+        self.lock = threading.Lock()
+        self._limpar()
+        armazenamento.registrar_ouvinte(self.ao_salvar)
+
+    def _limpar(self):
+        raise NotImplementedError
+
+    def _carregar(self, df):
+        raise NotImplementedError
+
+    def _adicionar(self, registro):
+        raise NotImplementedError
+
+    def reconstruir(self):
+        self.assinatura = None
+        self._atualizar()
+
+    def ao_salvar(self, caminho, registros, antes, depois):
+        if caminho != self.caminho:
+            return
+        with self.lock:
+            if self.assinatura != antes:
+                # Há linhas de fora ainda não lidas: estas entram junto com elas na próxima leitura da cauda
+                return
+            for r in registros:
+                self._adicionar(r)
+            self.assinatura = depois
+
+    def _atualizar(self):
+        if self.assinatura == armazenamento.assinatura_arquivo(self.caminho):
+            return
+        with armazenamento.Leitura(self.caminho, self.assinatura) as leitura:
+            if not leitura.cauda:
+                self._limpar()
+            with medir(f"{type(self).__name__}.{'cauda' if leitura.cauda else 'reconstruir'}"):
+                for bloco in leitura.blocos(self.colunas):
+                    self._carregar(bloco)
+            self.assinatura = leitura.assinatura
+
+
+class ResumoDiario(AgregadoIncremental):
+    # Rollup usuário x dia x atividade -> [segundos, quantidade]
+    colunas = ["usuario", "data", "atividade", "segundos_totais"]
+
+    def _limpar(self):
+        self.por_usuario = {}
+        self.por_dia = {}
+
+    def _somar(self, usuario, dia, atividade, segundos, quantidade):
+        dias = self.por_usuario.setdefault(usuario, {})
+        atividades = dias.setdefault(dia, {})
+        acumulado = atividades.setdefault(atividade, [0, 0])
+        acumulado[0] += segundos
+        acumulado[1] += quantidade
+        total = self.por_dia.setdefault(dia, {}).setdefault(usuario, [0, 0])
+        total[0] += segundos
+        total[1] += quantidade
+
+    def _carregar(self, df):
+        grupos = (df.dropna(subset=["data"])
+                  .groupby(["usuario", "data", "atividade"], observed=True, sort=False)["segundos_totais"]
+                  .agg(["sum", "size"]))
+        # zip sobre arrays: iterrows monta uma Series por grupo
+        for (usuario, dia, atividade), segundos, quantidade in zip(grupos.index, grupos["sum"].to_numpy(),
+                                                                   grupos["size"].to_numpy()):
+            self._somar(str(usuario), dia.date(), str(atividade), int(segundos), int(quantidade))
+
+    def _adicionar(self, registro):
+        dia = _para_data(registro.get("data"))
+        if dia is not None:
+            self._somar(str(registro.get("usuario", "")), dia, str(registro.get("atividade") or ""),
+                        _para_segundos(registro.get("segundos_totais")), 1)
+
+    def total_dia(self, dia, usuario=None):
+        with self.lock:
+            self._atualizar()
+            usuarios = self.por_dia.get(_para_data(dia), {})
+            if usuario is not None:
+                return tuple(usuarios.get(usuario, (0, 0)))
+            return (sum(v[0] for v in usuarios.values()), sum(v[1] for v in usuarios.values()))
+
+    def datas(self):
+        with self.lock:
+            self._atualizar()
+            return sorted((d for d, usuarios in self.por_dia.items() if usuarios), reverse=True)
+
+    def usuarios(self):
+        with self.lock:
+            self._atualizar()
+            return list(self.por_usuario)
+
+    def por_atividade(self, usuario, inicio=None, fim=None):
+        # Linhas (atividade, data, segundos_totais, quantidade) do usuário no intervalo [inicio, fim]
+        inicio, fim = _para_data(inicio) if inicio else None, _para_data(fim) if fim else None
+        linhas = []
+        with self.lock:
+            self._atualizar()
+            dias = self.por_usuario.get(usuario, {})
+            if inicio and fim:
+                intervalo = (inicio + timedelta(days=i) for i in range((fim - inicio).days + 1))
+                selecionados = ((d, dias[d]) for d in intervalo if d in dias)
+            else:
+                selecionados = ((d, a) for d, a in dias.items()
+                                if not (inicio and d < inicio) and not (fim and d > fim))
+            for dia, atividades in selecionados:
+                for atividade, (segundos, quantidade) in atividades.items():
+                    linhas.append((atividade, pd.Timestamp(dia), segundos, quantidade))
+        return pd.DataFrame(linhas, columns=["atividade", "data", "segundos_totais", "quantidade"])
+
+
+class IndiceRitm(AgregadoIncremental):
+    # RITM -> segundos totais e segundos por colaborador, e usuário -> RITMs em que trabalhou
+    colunas = ["usuario", "ritm_code", "segundos_totais"]
+
+    def _limpar(self):
+        self.por_ritm = {}
+        self.por_usuario = {}
+
+    def _somar(self, ritm, usuario, segundos):
+        contribuidores = self.por_ritm.setdefault(ritm, {})
+        contribuidores[usuario] = contribuidores.get(usuario, 0) + segundos
+        self.por_usuario.setdefault(usuario, {})[ritm] = None
+
+    def _carregar(self, df):
+        grupos = (df.dropna(subset=["ritm_code"])
+                  .groupby(["ritm_code", "usuario"], observed=True, sort=False)["segundos_totais"].sum())
+        for (ritm, usuario), segundos in grupos.items():
+            self._somar(str(ritm), str(usuario), int(segundos))
+
+    def _adicionar(self, registro):
+        if registro.get("ritm_code"):
+            self._somar(registro["ritm_code"], str(registro.get("usuario", "")),
+                        _para_segundos(registro.get("segundos_totais")))
+
+    def do_usuario(self, usuario):
+        with self.lock:
+            self._atualizar()
+            return list(self.por_usuario.get(usuario, {}))
+
+    def total(self, ritm):
+        with self.lock:
+            self._atualizar()
+            return sum(self.por_ritm.get(ritm, {}).values())
+
+    def contribuidores(self, ritm):
+        with self.lock:
+            self._atualizar()
+            return dict(self.por_ritm.get(ritm, {}))
+
+    def resumo(self):
+        with self.lock:
+            self._atualizar()
+            linhas = [(ritm, sum(c.values()), len(c)) for ritm, c in self.por_ritm.items()]
+        return pd.DataFrame(sorted(linhas), columns=["ritm_code", "segundos_totais", "contribuidores"])
+
+    def resumo_usuario(self, usuario):
+        # RITMs do usuário com o total de cada um, numa única passada com o lock (não um total() por RITM)
+        with self.lock:
+            self._atualizar()
+            linhas = [(ritm, sum(self.por_ritm[ritm].values())) for ritm in self.por_usuario.get(usuario, {})]
+        return pd.DataFrame(linhas, columns=["ritm_code", "segundos_totais"])
+
+
+resumo_diario = ResumoDiario()
+indice_ritm = IndiceRitm()
+
+
+# Limites dos dados enviados aos gráficos: o navegador recebe só os totais já agregados
+LIMITE_ATIVIDADES = 15
+MAX_BARRAS_DIARIAS = 92
+
+
+def horas_por_atividade(df, limite=LIMITE_ATIVIDADES):
+    # Top-N atividades por tempo; o restante vira uma barra "Outros"
+    totais = df.groupby("atividade")["segundos_totais"].sum().sort_values(ascending=False)
+    if len(totais) > limite:
+        outros = totais.iloc[limite - 1:].sum()
+        totais = pd.concat([totais.iloc[:limite - 1], pd.Series({"Outros": outros})])
+    return pd.DataFrame({"atividade": totais.index, "Horas": totais.to_numpy() / 3600})
+
+
+def horas_por_periodo(df, max_barras=MAX_BARRAS_DIARIAS):
+    # Totais por dia; períodos longos são reagrupados por semana para não passar de max_barras
+    totais = df.groupby("data")["segundos_totais"].sum().sort_index()
+    semanal = len(totais) > 0 and (totais.index.max() - totais.index.min()).days >= max_barras
+    if semanal:
+        totais = totais.resample("W-MON", label="left", closed="left").sum()
+    return pd.DataFrame({"data": totais.index, "Horas": totais.to_numpy() / 3600}), semanal
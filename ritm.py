@@ -0,0 +1,64 @@
+import argparse
+import re
+
+import pandas as pd
+
+from metricas import medir
+
+
+PADRAO_RITM = re.compile(r'(RITM-?\d+)')
+
+
+def normalizar_ritm(codigo):
+    # "RITM-123" e "RITM123" são o mesmo chamado
+    if not isinstance(codigo, str) or not codigo: return None
+    return codigo.upper().replace("-", "")
+
+
+def status_precisa_normalizar(status):
+    return any(normalizar_ritm(chave) not in (chave, None) for chave in status)
+
+
+def normalizar_status(status):
+    # Troca in-place chaves antigas como "RITM-123" por "RITM123" (usado com status_ritm_db.atualizar).
+    # Se as duas formas existem, fica o valor da já normalizada.
+    for chave in list(status):
+        normalizada = normalizar_ritm(chave)
+        if normalizada not in (chave, None):
+            status.setdefault(normalizada, status.pop(chave))
+
+
+def extrair_ritm(texto):
+    if not isinstance(texto, str): return None
+    match = PADRAO_RITM.search(texto.upper())
+    if match:
+        return normalizar_ritm(match.group(1))
+    return None
+
+
+def extrair_ritm_series(serie):
+    # Versão vetorizada de extrair_ritm para uma coluna inteira (NA onde não há RITM).
+    # Os nomes de atividade se repetem muito, então a regex roda só sobre os valores distintos.
+    with medir("ritm.extrair"):
+        posicoes, distintos = pd.factorize(serie.astype("string"))
+        codigos = (pd.Series(distintos, dtype="string").str.upper()
+                   .str.extract(PADRAO_RITM, expand=False).str.replace("-", "", regex=False))
+    return pd.Series(codigos.array.take(posicoes, allow_fill=True), index=serie.index, dtype="string")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preenche/normaliza a coluna ritm_code do histórico em blocos")
+    parser.add_argument("arquivo", nargs="?", default=None)
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    args = parser.parse_args()
+
+    import armazenamento
+    try:
+        linhas = armazenamento.normalizar_ritms(args.arquivo or armazenamento.FILE_DB, args.chunksize)
+    except ValueError as erro:
+        parser.error(str(erro))
+    print(f"{linhas} linhas processadas")
+
+
+if __name__ == "__main__":
+    main()
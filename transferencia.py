@@ -0,0 +1,150 @@
+import tempfile
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+import armazenamento
+from metricas import medir
+from registro import Registro, para_exibicao
+
+
+COLUNAS_EXPORTACAO = ["usuario", "atividade", "data", "hora_inicio", "hora_fim", "duracao_formatada",
+                      "segundos_totais", "tipo", "ritm_code"]
+COLUNAS_IMPORTACAO = ["usuario", "atividade", "data", "hora_inicio", "hora_fim"]
+# Colunas gravadas de onde saem as de exportação (horários e duração em texto são derivados)
+COLUNAS_CONSULTA = ["usuario", "atividade", "data", "inicio", "fim", "segundos_totais", "tipo", "ritm_code"]
+# Acima disso o arquivo temporário da exportação sai da memória e vai para o disco
+LIMITE_MEMORIA_EXPORTACAO = 8 * 1024 * 1024
+
+
+def _conteudo(destino):
+    # O download_button do Streamlit só aceita str/bytes/BytesIO/BufferedReader, não SpooledTemporaryFile
+    with destino:
+        destino.seek(0)
+        return destino.read()
+
+
+def exportar_csv(usuario=None, inicio=None, fim=None):
+    # Escreve bloco a bloco num arquivo temporário; o resultado nunca vira um DataFrame único
+    destino = tempfile.SpooledTemporaryFile(max_size=LIMITE_MEMORIA_EXPORTACAO, mode="w+b")
+    destino.write(",".join(COLUNAS_EXPORTACAO).encode("utf-8") + b"\n")
+    with medir("exportar.csv"):
+        for bloco in armazenamento.consultar_em_blocos(usuario, inicio, fim, COLUNAS_CONSULTA):
+            bloco = para_exibicao(bloco)[COLUNAS_EXPORTACAO]
+            texto = bloco.to_csv(header=False, index=False, lineterminator="\n", date_format="%Y-%m-%d")
+            destino.write(texto.encode("utf-8"))
+    return _conteudo(destino)
+
+
+def exportar_xlsx(usuario=None, inicio=None, fim=None):
+    if openpyxl is None:
+        raise RuntimeError("Exportar para Excel precisa do pacote openpyxl (pip install openpyxl)")
+    # write_only grava as linhas em sequência sem manter a planilha inteira em memória
+    livro = openpyxl.Workbook(write_only=True)
+    planilha = livro.create_sheet("registros")
+    planilha.append(COLUNAS_EXPORTACAO)
+    with medir("exportar.xlsx"):
+        for bloco in armazenamento.consultar_em_blocos(usuario, inicio, fim, COLUNAS_CONSULTA):
+            bloco = para_exibicao(bloco)[COLUNAS_EXPORTACAO]
+            bloco = bloco.astype(object).where(bloco.notna(), None)
+            bloco["data"] = [d.strftime("%Y-%m-%d") if d is not None else None for d in bloco["data"]]
+            for linha in bloco.itertuples(index=False):
+                planilha.append(list(linha))
+    destino = tempfile.SpooledTemporaryFile(max_size=LIMITE_MEMORIA_EXPORTACAO, mode="w+b")
+    livro.save(destino)
+    return _conteudo(destino)
+
+
+def ler_planilha(arquivo, nome):
+    if nome.lower().endswith(".xlsx"):
+        if openpyxl is None:
+            raise RuntimeError("Importar Excel precisa do pacote openpyxl (pip install openpyxl)")
+        return pd.read_excel(arquivo, dtype=str).fillna("")
+    return pd.read_csv(arquivo, dtype=str, keep_default_na=False)
+
+
+def _hora(valor):
+    for formato in ("%H:%M:%S", "%H:%M"):
+        try:
+            return datetime.strptime(valor.strip(), formato).time()
+        except ValueError:
+            pass
+    return None
+
+
+def _data(valor):
+    # Células de data do Excel chegam (com dtype=str) como "AAAA-MM-DD 00:00:00"
+    for formato in ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(valor.strip(), formato).date()
+        except ValueError:
+            pass
+    return None
+
+
+def _segundos(valor):
+    # segundos_totais opcional (vem nas planilhas exportadas pelo próprio app); "" = não informado
+    valor = valor.strip()
+    if not valor:
+        return None, True
+    try:
+        segundos = int(float(valor))
+    except ValueError:
+        return None, False
+    return segundos, segundos >= 0
+
+
+def validar_importacao(df, usuarios_validos):
+    # Devolve (registros válidos, erros); cada erro é (linha da planilha, motivo).
+    # Com segundos_totais preenchido (exportação do app), a duração vem dele: hora_inicio pode ser vazia/"N/A"
+    # (timer finalizado pausado), a duração pode ser zero e um início depois do fim é da véspera.
+    faltando = [c for c in COLUNAS_IMPORTACAO if c not in df.columns]
+    if faltando:
+        return [], [(1, f"Colunas ausentes: {', '.join(faltando)}")]
+
+    colunas = COLUNAS_IMPORTACAO + ["segundos_totais"]
+    df = df.reindex(columns=colunas, fill_value="").fillna("")
+    registros = []
+    erros = []
+    for i, linha in enumerate(df[colunas].astype(str).itertuples(index=False), start=2):
+        usuario, atividade, data, hora_inicio, hora_fim, segundos = (v.strip() for v in linha)
+        if usuario not in usuarios_validos:
+            erros.append((i, f"Usuário desconhecido: '{usuario}'"))
+            continue
+        if not atividade:
+            erros.append((i, "Atividade vazia"))
+            continue
+        dia = _data(data)
+        if dia is None:
+            erros.append((i, f"Data inválida: '{data}' (use AAAA-MM-DD)"))
+            continue
+        segundos, ok = _segundos(segundos)
+        if not ok:
+            erros.append((i, f"Segundos inválidos: '{linha[5]}'"))
+            continue
+        sem_inicio = segundos is not None and hora_inicio.upper() in ("", "N/A")
+        ini, fim = None if sem_inicio else _hora(hora_inicio), _hora(hora_fim)
+        if fim is None or (ini is None and not sem_inicio):
+            erros.append((i, f"Hora inválida: '{hora_inicio}' / '{hora_fim}' (use HH:MM ou HH:MM:SS)"))
+            continue
+        fim = datetime.combine(dia, fim)
+        ini = None if sem_inicio else datetime.combine(dia, ini)
+        if segundos is None:
+            if ini >= fim:
+                erros.append((i, "Hora fim <= Hora início"))
+                continue
+        elif ini is not None and ini > fim:
+            ini -= timedelta(days=1)
+        registros.append(Registro.intervalo(usuario, atividade, ini, fim, "importado", segundos))
+    return registros, erros
+
+
+def importar_registros(registros):
+    # Uma única gravação (um lock, um append) para o lote inteiro
+    with medir("importar"):
+        return armazenamento.salvar_registros(registros)